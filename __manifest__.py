@@ -1,6 +1,6 @@
 {
     'name': 'DMS Property Integration',
-    'version': '19.0.4.0.0',
+    'version': '19.0.4.1.0',
     'category': 'Document Management',
     'summary': 'AI-Assisted Document Management with Retention Policies for Real Estate',
     'description': """
@@ -65,6 +65,6 @@ AI-assisted Document Management System for real estate:
     'installable': True,
     'license': 'LGPL-3',
     'external_dependencies': {
-        'python': [],  # openai, anthropic are optional
+        'python': [],  # openai, anthropic, orjson, hyperscan are optional
     },
 }
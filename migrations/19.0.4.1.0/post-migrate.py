@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+
+OLD_CODE = 'model._cron_process_queue(limit=10)'
+NEW_CODE = "model._cron_process_queue(limit=10, priorities=['1'])"
+
+
+def migrate(cr, version):
+    """Restrict the original queue cron to normal priority
+
+    The cron data is noupdate, so databases installed before the per-priority
+    crons keep processing every priority from this cron.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['ir.cron'].with_context(active_test=False).search([
+        ('model_id.model', '=', 'dms.document.processing.queue'),
+        ('code', '=', OLD_CODE),
+    ]).write({'code': NEW_CODE})
@@ -1,12 +1,210 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+import json
 import logging
 import base64
-from odoo import models, fields, api, _
+import io
+import re
+import threading
+import time
+from datetime import timedelta
+from psycopg2 import IntegrityError, errors
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+try:
+    import anthropic
+except ImportError:
+    anthropic = None
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+except ImportError:
+    requests = None
+
 _logger = logging.getLogger(__name__)
 
+# Provider batch limits (OpenAI: 50k requests / 200 MB per input file)
+BATCH_MAX_REQUESTS = 50000
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+
+# Larger images are uploaded through the Claude Files API instead of being
+# inlined as base64 (the messages API rejects inline images over 5 MB encoded)
+CLAUDE_INLINE_IMAGE_MAX_BYTES = 3 * 1024 * 1024
+CLAUDE_FILES_BETA = 'files-api-2025-04-14'
+
+# Keywords that identify a German document type on their own, used by the
+# rule fast path on the attachment's extracted text: (pattern, type, sub_type)
+DOCUMENT_TYPE_KEYWORDS = [
+    (rb'\bRechnung', 'invoice', 'invoice'),
+    (rb'Vertrag', 'contract', 'contract'),
+    (rb'Mietvertrag', 'contract', 'lease'),
+    (rb'Versicherungspolice', 'contract', 'insurance_policy'),
+    (rb'\bKontoauszug', 'other', 'bank_statement'),
+    (rb'Steuerbescheid', 'tax', 'tax_assessment'),
+    (rb'Lohnabrechnung', 'other', 'payslip'),
+    (rb'\bBewerbung', 'correspondence', 'application'),
+]
+RULE_MATCH_CONFIDENCE = 0.9
+
+CLASSIFICATION_PROMPT = """Analyze this document image and classify it. Return JSON with:
+{
+    "document_type": "invoice|contract|certificate|correspondence|tax|medical|id_document|other",
+    "sub_type": "specific type within category",
+    "language": "de|en|other",
+    "confidence": 0.0-1.0,
+    "extracted_data": {
+        "vendor_name": "if applicable",
+        "amount": "numeric value if found",
+        "currency": "EUR|USD|etc",
+        "date": "YYYY-MM-DD if found",
+        "reference": "invoice/contract number if found"
+    },
+    "suggested_tags": ["list", "of", "relevant", "tags"],
+    "sensitivity": "public|internal|confidential|restricted",
+    "retention_years": "suggested retention period based on German law"
+}
+
+German document types to detect:
+- Rechnung (Invoice)
+- Vertrag (Contract)
+- Kontoauszug (Bank Statement)
+- Steuerbescheid (Tax Notice)
+- Mietvertrag (Lease Agreement)
+- Versicherungspolice (Insurance Policy)
+- Lohnabrechnung (Payroll)
+- Bewerbung (Application)
+"""
+
+# Bump whenever the classification prompt changes, invalidates cached results
+PROMPT_VERSION = 1
+
+# Cached classifications (vendor, amounts, references) older than this are
+# dropped by the autovacuum
+CLASSIFICATION_CACHE_MAX_AGE_DAYS = 180
+
+# Key of the pending service statistics in the cursor's postcommit data
+STATISTICS_KEY = 'dms.ai.classification.service.statistics'
+
+# HTTP statuses worth retrying on another provider right away; 529 is
+# Anthropic's "overloaded"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+# Seconds to wait for a local Ollama classification
+LOCAL_REQUEST_TIMEOUT = 120
+
+# The pre-classifier only saves time when it answers fast; on a timeout the
+# cloud provider is asked instead
+PRECLASSIFIER_TIMEOUT = 10
+
+# SDK clients keyed on (provider, api_key, api_endpoint), so every request of
+# a worker reuses the same connection pool instead of a new TLS handshake
+_CLIENT_CACHE = {}
+
+# Pooled HTTP sessions for the local Ollama API keyed on whether failed
+# requests are retried, created on first use
+_LOCAL_SESSIONS = {}
+_LOCAL_SESSION_LOCK = threading.Lock()
+
+
+def json_loads(data):
+    """Parse JSON, with orjson when it is installed"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def json_dumps(value):
+    """Serialize to a JSON string, with orjson when it is installed"""
+    return orjson.dumps(value).decode('utf-8') if orjson else json.dumps(value)
+
+
+def _compile_keyword_matcher():
+    """Compile DOCUMENT_TYPE_KEYWORDS into a function returning the hit indexes
+
+    Uses a single Hyperscan database when the binding is installed and
+    falls back to one compiled regex per keyword otherwise.
+    """
+    if hyperscan is not None:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[pattern for pattern, _type, _sub in DOCUMENT_TYPE_KEYWORDS],
+            ids=list(range(len(DOCUMENT_TYPE_KEYWORDS))),
+            elements=len(DOCUMENT_TYPE_KEYWORDS),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH]
+                  * len(DOCUMENT_TYPE_KEYWORDS),
+        )
+
+        # A scratch space must not be used by two scans at once, so every
+        # thread allocates its own on first use
+        local = threading.local()
+
+        def match(data):
+            scratch = getattr(local, 'scratch', None)
+            if scratch is None:
+                scratch = local.scratch = hyperscan.Scratch(database)
+            hits = set()
+            database.scan(
+                data,
+                match_event_handler=lambda idx, *args: hits.add(idx),
+                scratch=scratch,
+            )
+            return hits
+        return match
+
+    patterns = [re.compile(pattern, re.IGNORECASE) for pattern, _type, _sub in DOCUMENT_TYPE_KEYWORDS]
+
+    def match(data):
+        return {idx for idx, pattern in enumerate(patterns) if pattern.search(data)}
+    return match
+
+
+_match_keywords = _compile_keyword_matcher()
+
+
+def _get_local_session(retry=True):
+    """Return the shared requests session used for Ollama calls
+
+    :param retry: whether connection errors and retryable statuses are
+                  retried with backoff
+    """
+    session = _LOCAL_SESSIONS.get(retry)
+    if session is None:
+        with _LOCAL_SESSION_LOCK:
+            session = _LOCAL_SESSIONS.get(retry)
+            if session is None:
+                session = requests.Session()
+                session.mount('http://', HTTPAdapter(
+                    pool_connections=32,
+                    pool_maxsize=32,
+                    max_retries=Retry(
+                        total=3,
+                        backoff_factor=0.5,
+                        status_forcelist=sorted(RETRYABLE_STATUS_CODES),
+                        allowed_methods=None,  # generate is a POST
+                        raise_on_status=False,
+                    ) if retry else 0,
+                ))
+                session.mount('https://', session.get_adapter('http://'))
+                _LOCAL_SESSIONS[retry] = session
+    return session
+
 
 class AIClassificationService(models.Model):
     """AI Classification Service for Document Analysis"""
@@ -49,6 +247,59 @@ class AIClassificationService(models.Model):
         help='Automatically extract vendor, amount, date from invoices',
     )
 
+    fallback_service_ids = fields.Many2many(
+        'dms.ai.classification.service',
+        'dms_ai_classification_service_fallback_rel',
+        'service_id',
+        'fallback_service_id',
+        string='Fallback Services',
+        help='Services tried in order when this provider is rate limited or unavailable',
+    )
+
+    max_concurrency = fields.Integer(
+        string='Max Concurrent Requests',
+        default=8,
+        help='Maximum number of simultaneous provider requests when the queue is processed',
+    )
+
+    # Local pre-classification
+    local_preclassifier_endpoint = fields.Char(
+        string='Pre-Classifier Endpoint',
+        help='Ollama generate endpoint asked first for images; the cloud provider is only '
+             'called when its confidence is below the skip threshold. Leave empty to disable.',
+    )
+
+    local_preclassifier_model = fields.Char(
+        string='Pre-Classifier Model',
+        default='llava',
+    )
+
+    skip_cloud_threshold = fields.Float(
+        string='Skip Cloud Threshold',
+        default=0.9,
+        help='Minimum pre-classifier confidence to use its result without a cloud call',
+    )
+
+    max_file_size_mb = fields.Integer(
+        string='Max Image Size (MB)',
+        default=20,
+        help='Images larger than this are rejected before any provider call',
+    )
+
+    use_rule_fast_path = fields.Boolean(
+        string='Rule Fast Path',
+        default=False,
+        help='Classify documents whose extracted text contains exactly one unambiguous '
+             'German document keyword (e.g. Rechnung, Mietvertrag) without calling the provider',
+    )
+
+    use_batch_api = fields.Boolean(
+        string='Use Batch API',
+        default=False,
+        help='Submit low and normal priority queue items through the provider batch API '
+             '(about half the cost, results within 24 hours). OpenAI and Claude only.',
+    )
+
     # Statistics
     documents_processed = fields.Integer(
         string='Documents Processed',
@@ -61,93 +312,579 @@ class AIClassificationService(models.Model):
         digits=(4, 2),
     )
 
+    confidence_samples = fields.Integer(
+        string='Confidence Samples',
+        readonly=True,
+        help='Number of results with a confidence score averaged into Avg Confidence Score',
+    )
+
+    cloud_bypass_count = fields.Integer(
+        string='Cloud Calls Skipped',
+        readonly=True,
+    )
+
+    cloud_bypass_rate = fields.Float(
+        string='Cloud Bypass Rate',
+        compute='_compute_cloud_bypass_rate',
+        digits=(4, 2),
+    )
+
     last_run = fields.Datetime(string='Last Run', readonly=True)
 
+    @api.depends('cloud_bypass_count', 'documents_processed')
+    def _compute_cloud_bypass_rate(self):
+        for service in self:
+            service.cloud_bypass_rate = (
+                service.cloud_bypass_count / service.documents_processed
+                if service.documents_processed else 0.0
+            )
+
+    def write(self, vals):
+        if {'provider', 'api_key', 'api_endpoint'} & set(vals):
+            # Drop clients built with the old credentials
+            for service in self.sudo():
+                _CLIENT_CACHE.pop(
+                    (service.provider, service.api_key, service.api_endpoint), None
+                )
+        return super().write(vals)
+
     def _get_classification_prompt(self):
         """Return the classification prompt for AI"""
-        return """Analyze this document image and classify it. Return JSON with:
-{
-    "document_type": "invoice|contract|certificate|correspondence|tax|medical|id_document|other",
-    "sub_type": "specific type within category",
-    "language": "de|en|other",
-    "confidence": 0.0-1.0,
-    "extracted_data": {
-        "vendor_name": "if applicable",
-        "amount": "numeric value if found",
-        "currency": "EUR|USD|etc",
-        "date": "YYYY-MM-DD if found",
-        "reference": "invoice/contract number if found"
-    },
-    "suggested_tags": ["list", "of", "relevant", "tags"],
-    "sensitivity": "public|internal|confidential|restricted",
-    "retention_years": "suggested retention period based on German law"
-}
+        return CLASSIFICATION_PROMPT
 
-German document types to detect:
-- Rechnung (Invoice)
-- Vertrag (Contract)
-- Kontoauszug (Bank Statement)
-- Steuerbescheid (Tax Notice)
-- Mietvertrag (Lease Agreement)
-- Versicherungspolice (Insurance Policy)
-- Lohnabrechnung (Payroll)
-- Bewerbung (Application)
-"""
+    def _get_document_content(self, document):
+        """Return (content, content_type) for the first attachment of a document
+
+        Only images are sent to the providers, so only their binary is
+        loaded; for other types content is None and nothing is read from
+        the filestore.
+        """
+        attachment = document.attachment_ids[0]
 
-    def classify_document(self, document):
-        """Classify a single document using AI"""
+        if attachment.mimetype and attachment.mimetype.startswith('image/'):
+            # Raw bytes; providers encode them only if their API needs it
+            return attachment.raw, 'image'
+        elif attachment.mimetype == 'application/pdf':
+            # For PDF, we'd need OCR first
+            return None, 'pdf'
+        return None, 'text'
+
+    def _update_statistics(self, result, bypassed=False):
+        """Record a processed document on the service
+
+        Counters are accumulated for the current transaction and written
+        once it commits, in a short transaction of their own. Updating the
+        service row directly would keep it locked across every following
+        provider round-trip of a cron run and, under REPEATABLE READ, make
+        parallel runs fail on it. The mean only counts results that carry
+        a confidence score.
+        """
+        self.ensure_one()
+        confidence = self._result_confidence(result) if 'error' not in result else None
+        postcommit = self.env.cr.postcommit
+        if STATISTICS_KEY not in postcommit.data:
+            postcommit.add(self._flush_statistics)
+        stats = postcommit.data.setdefault(STATISTICS_KEY, {})
+        counters = stats.setdefault(self.id, [0, 0.0, 0, 0])
+        counters[0] += 1
+        if confidence is not None:
+            counters[1] += confidence
+            counters[2] += 1
+        counters[3] += int(bypassed)
+
+    def _flush_statistics(self):
+        """Apply the counters of the committed transaction, one UPDATE per service"""
+        stats = self.env.cr.postcommit.data.get(STATISTICS_KEY)
+        if not stats:
+            return
+        for attempt in range(3):
+            try:
+                with self.env.registry.cursor() as cr:
+                    for service_id, (processed, confidence_sum, samples, bypassed) in stats.items():
+                        cr.execute(f"""
+                            UPDATE {self._table}
+                               SET documents_processed = COALESCE(documents_processed, 0) + %(processed)s,
+                                   avg_confidence = CASE WHEN %(samples)s > 0
+                                       THEN (COALESCE(avg_confidence, 0) * COALESCE(confidence_samples, 0)
+                                             + %(confidence_sum)s)
+                                            / (COALESCE(confidence_samples, 0) + %(samples)s)
+                                       ELSE avg_confidence END,
+                                   confidence_samples = COALESCE(confidence_samples, 0) + %(samples)s,
+                                   cloud_bypass_count = COALESCE(cloud_bypass_count, 0) + %(bypassed)s,
+                                   last_run = (now() at time zone 'UTC')
+                             WHERE id = %(id)s
+                        """, {
+                            'processed': processed,
+                            'confidence_sum': confidence_sum,
+                            'samples': samples,
+                            'bypassed': bypassed,
+                            'id': service_id,
+                        })
+                return
+            except errors.SerializationFailure:
+                # Another worker updated the same services concurrently
+                if attempt == 2:
+                    _logger.warning("Could not record AI service statistics: %s", stats)
+
+    def _result_confidence(self, result):
+        """Return a classification's confidence as a float, or None"""
+        try:
+            return float(result['confidence'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def classify_document(self, document, text=None):
+        """Classify a single document using AI
+
+        :param text: text already extracted from the document (e.g. by OCR),
+                     used by the rule fast path instead of the attachment index
+        """
         self.ensure_one()
 
         if not document.attachment_ids:
             return {'error': 'No attachment found'}
 
-        attachment = document.attachment_ids[0]
+        error = self._precheck(document.attachment_ids[0])
+        if error:
+            return {'error': error, 'non_retryable': True}
 
-        # Get document content
-        if attachment.mimetype and attachment.mimetype.startswith('image/'):
-            content = base64.b64encode(attachment.raw).decode('utf-8')
-            content_type = 'image'
-        elif attachment.mimetype == 'application/pdf':
-            # For PDF, we'd need OCR first
-            content = attachment.raw
-            content_type = 'pdf'
-        else:
-            content = attachment.raw
-            content_type = 'text'
+        cached = self._get_cached_classification(document.attachment_ids[0])
+        if cached:
+            return cached
+
+        attempts = []
+        result = self._rule_fast_path(document.attachment_ids[0], attempts, text=text)
+        if result is not None:
+            return result
+
+        content, content_type = self._get_document_content(document)
+
+        result = self._preclassify(content, content_type, attempts)
+        if result is None:
+            result = self._classify_with_fallback(
+                content, content_type, self | self.fallback_service_ids, attempts,
+                attachment=document.attachment_ids[0],
+            )
+        return result
 
+    def _rule_classify(self, text):
+        """Return (document_type, sub_type) if the text names exactly one type
+
+        :param text: extracted document text (str or UTF-8 bytes)
+        """
+        if not text:
+            return None
+        if isinstance(text, str):
+            text = text.encode('utf-8')
+        hits = [DOCUMENT_TYPE_KEYWORDS[idx][1:] for idx in sorted(_match_keywords(text))]
+        if len({doc_type for doc_type, _sub in hits}) != 1:
+            return None
+        # Prefer the first specific sub type in keyword order, e.g. lease over contract
+        specific = [hit for hit in hits if hit[1] != hit[0]]
+        return (specific or hits)[0]
+
+    def _rule_fast_path(self, attachment, attempts, text=None):
+        """Classify from the document text without a provider call
+
+        Uses ``text`` when given, else the attachment's indexed text.
+        Returns None when the fast path is disabled or the keywords are
+        missing or ambiguous.
+        """
+        if not self.use_rule_fast_path:
+            return None
+        start_time = time.time()
+        match = self._rule_classify(text or attachment.index_content)
+        if not match:
+            return None
+
+        result = {
+            'document_type': match[0],
+            'sub_type': match[1],
+            'language': 'de',
+            'confidence': RULE_MATCH_CONFIDENCE,
+            'extracted_data': {},
+            'suggested_tags': [],
+        }
+        attempts.append(self._attempt_info(start_time, provider='rules'))
+
+        # Update statistics
+        self._update_statistics(result, bypassed=True)
+
+        result['attempts'] = attempts
+        return result
+
+    def _use_preclassifier(self, content_type):
+        """Whether the local pre-classifier should be asked before the provider"""
+        self.ensure_one()
+        return bool(
+            content_type == 'image'
+            and self.local_preclassifier_endpoint
+            and self.provider != 'local'
+        )
+
+    def _preclassifier_request(self, content, content_type):
+        """Return the (endpoint, payload) pair for the local pre-classifier"""
+        return self._local_request(
+            content, content_type,
+            endpoint=self.local_preclassifier_endpoint,
+            model=self.local_preclassifier_model,
+        )
+
+    def _post_local(self, endpoint, payload, timeout=LOCAL_REQUEST_TIMEOUT, retry=True):
+        """Send an Ollama request and parse it; touches no ORM state"""
+        response = _get_local_session(retry).post(endpoint, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return self._parse_local_response(response)
+
+    def _preclassify(self, content, content_type, attempts):
+        """Return the local pre-classifier's result if it is confident enough
+
+        Returns None when the cloud provider has to be asked.
+        """
+        if not self._use_preclassifier(content_type):
+            return None
+        start_time = time.time()
         try:
+            endpoint, payload = self._preclassifier_request(content, content_type)
+            result = self._post_local(
+                endpoint, payload, timeout=PRECLASSIFIER_TIMEOUT, retry=False,
+            )
+        except Exception as e:
+            _logger.warning(f"Local pre-classification failed ({self.name}): {e}")
+            attempts.append(self._attempt_info(start_time, str(e), provider='local'))
+            return None
+        return self._accept_preclassification(result, start_time, attempts)
+
+    def _accept_preclassification(self, result, start_time, attempts):
+        """Keep a pre-classification above the skip threshold, else return None"""
+        attempts.append(self._attempt_info(start_time, result.get('error'), provider='local'))
+        confidence = self._result_confidence(result) or 0.0
+        if 'error' in result or confidence < self.skip_cloud_threshold:
+            return None
+
+        # Update statistics
+        self._update_statistics(result, bypassed=True)
+
+        result['attempts'] = attempts
+        return result
+
+    def _precheck(self, attachment):
+        """Return why an attachment cannot be classified, or None
+
+        Runs before any provider call on metadata only, so pathological
+        inputs fail fast instead of after a slow upload.
+        """
+        self.ensure_one()
+        mimetype = attachment.mimetype or ''
+        if not (mimetype.startswith(('image/', 'text/')) or mimetype == 'application/pdf'):
+            return f'Unsupported file type: {mimetype or "unknown"}'
+        max_bytes = (self.max_file_size_mb or 0) * 1024 * 1024
+        if mimetype.startswith('image/') and max_bytes and attachment.file_size > max_bytes:
+            return (f'Image too large: {attachment.file_size / 1024 / 1024:.1f} MB '
+                    f'(limit {self.max_file_size_mb} MB)')
+        return None
+
+    def _get_cached_classification(self, attachment):
+        """Return a previous classification of identical content, if any
+
+        Only answers of this service's own provider and model are reused.
+        The ``dms_ai_skip_cache`` context key forces a fresh classification.
+        """
+        self.ensure_one()
+        if not attachment.checksum or self.env.context.get('dms_ai_skip_cache'):
+            return None
+        hit = self.env['dms.ai.classification.cache'].sudo().search(
+            self._get_cache_domain(attachment), limit=1,
+        )
+        if not hit:
+            return None
+        result = json_loads(hit.result_json)
+        result['attempts'] = []
+        return result
+
+    def _store_cached_classification(self, attachment, result):
+        """Remember a successful classification for identical content
+
+        Must be called on the service whose provider produced the result,
+        the entry is keyed on its provider and model.
+        """
+        self.ensure_one()
+        if not attachment.checksum or 'error' in result or 'raw_response' in result:
+            return
+        Cache = self.env['dms.ai.classification.cache'].sudo()
+        result_json = json_dumps({k: v for k, v in result.items() if k != 'attempts'})
+        # A forced re-classification replaces the previous answer
+        hit = Cache.search(self._get_cache_domain(attachment), limit=1)
+        if hit:
+            hit.result_json = result_json
+            return
+        try:
+            with self.env.cr.savepoint():
+                Cache.create({
+                    'key': attachment.checksum,
+                    'provider': self.provider,
+                    'model_name': self.model_name,
+                    'prompt_version': PROMPT_VERSION,
+                    'result_json': result_json,
+                })
+        except IntegrityError:
+            # Classified concurrently by another worker, keep its entry
+            pass
+
+    def _get_cache_domain(self, attachment):
+        """Domain of the cache entry of this service for the attachment's content"""
+        self.ensure_one()
+        return [
+            ('key', '=', attachment.checksum),
+            ('provider', '=', self.provider),
+            ('model_name', '=', self.model_name or False),
+            ('prompt_version', '=', PROMPT_VERSION),
+        ]
+
+    def _classify_once(self, content, content_type):
+        """Classify content with this service's provider only"""
+        self.ensure_one()
+        if self.provider == 'openai':
+            return self._classify_openai(content, content_type)
+        elif self.provider == 'claude':
+            return self._classify_claude(content, content_type)
+        elif self.provider == 'azure':
+            return self._classify_azure(content, content_type)
+        elif self.provider == 'local':
+            return self._classify_local(content, content_type)
+        return {'error': f'Provider {self.provider} not implemented'}
+
+    def _classify_with_fallback(self, content, content_type, services, attempts, attachment=None):
+        """Try services in order until one of them answers
+
+        Retryable failures (rate limits, 5xx, network errors) move on to the
+        next service immediately; any other failure stops the chain. Every
+        attempt is appended to ``attempts`` and returned under that key.
+        When ``attachment`` is given the answer is cached under the service
+        that produced it.
+        """
+        result = {'error': 'No AI classification service available'}
+
+        for service in services:
+            start_time = time.time()
+            try:
+                result = service._classify_once(content, content_type)
+            except Exception as e:
+                _logger.error(f"AI Classification error ({service.name}): {str(e)}")
+                result = {'error': str(e)}
+                attempts.append(service._attempt_info(start_time, result['error']))
+                if service._is_retryable_error(e):
+                    continue
+                break
+
+            attempts.append(service._attempt_info(start_time, result.get('error')))
+
+            # Update statistics
+            service._update_statistics(result)
+            if attachment:
+                service._store_cached_classification(attachment, result)
+            break
+
+        result['attempts'] = attempts
+        return result
+
+    def _attempt_info(self, start_time, error=None, provider=None):
+        """Describe one provider attempt for the classification log"""
+        return {
+            'service': self.name,
+            'provider': provider or self.provider,
+            'latency_ms': int((time.time() - start_time) * 1000),
+            'error': error or None,
+        }
+
+    def _is_retryable_error(self, error):
+        """Whether a provider exception is transient (rate limit, 5xx, network)
+
+        Authentication and validation errors are not: another provider
+        would not fix them and they should surface immediately.
+        """
+        status = getattr(error, 'status_code', None)
+        if status is None:
+            status = getattr(getattr(error, 'response', None), 'status_code', None)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+
+        transient = []
+        if openai is not None:
+            transient.append(openai.APIConnectionError)
+        if anthropic is not None:
+            transient.append(anthropic.APIConnectionError)
+        if requests is not None:
+            transient.extend([requests.ConnectionError, requests.Timeout])
+        return isinstance(error, tuple(transient))
+
+    def _get_client(self):
+        """Return the cached SDK client for this service's provider
+
+        Raises ImportError if the provider package is not installed.
+        """
+        self.ensure_one()
+        key = (self.provider, self.api_key, self.api_endpoint)
+        client = _CLIENT_CACHE.get(key)
+        if client is None:
             if self.provider == 'openai':
-                result = self._classify_openai(content, content_type)
+                if openai is None:
+                    raise ImportError('openai package not installed')
+                client = openai.OpenAI(api_key=self.api_key)
             elif self.provider == 'claude':
-                result = self._classify_claude(content, content_type)
-            elif self.provider == 'azure':
-                result = self._classify_azure(content, content_type)
-            elif self.provider == 'local':
-                result = self._classify_local(content, content_type)
+                if anthropic is None:
+                    raise ImportError('anthropic package not installed')
+                client = anthropic.Anthropic(api_key=self.api_key)
             else:
-                result = {'error': f'Provider {self.provider} not implemented'}
+                return None
+            client = _CLIENT_CACHE.setdefault(key, client)
+        return client
 
-            # Update statistics
-            self.sudo().write({
-                'documents_processed': self.documents_processed + 1,
-                'last_run': fields.Datetime.now(),
-            })
+    def _get_async_client(self):
+        """Return an async SDK client for the provider, or None if it has none
+
+        The client is meant to be shared by all documents of a queue run so
+        the connection pool and TLS sessions are reused between requests.
+        """
+        self.ensure_one()
+        if self.provider == 'openai' and openai is not None:
+            return openai.AsyncOpenAI(api_key=self.api_key)
+        elif self.provider == 'claude' and anthropic is not None:
+            return anthropic.AsyncAnthropic(api_key=self.api_key)
+        return None
+
+    async def _classify_document_async(self, document, clients=None):
+        """Async counterpart of classify_document used by the queue cron
+
+        Runs in the cron thread's event loop, so ORM access stays
+        single-threaded; only the provider round-trips are awaited, for
+        the fallback services as well.
+
+        :param clients: async SDK clients by service id, see
+                        _classify_with_fallback_async
+        """
+        self.ensure_one()
 
+        if not document.attachment_ids:
+            return {'error': 'No attachment found'}
+
+        attachment = document.attachment_ids[0]
+        error = self._precheck(attachment)
+        if error:
+            return {'error': error, 'non_retryable': True}
+
+        cached = self._get_cached_classification(attachment)
+        if cached:
+            return cached
+
+        attempts = []
+        result = self._rule_fast_path(attachment, attempts)
+        if result is not None:
             return result
 
-        except Exception as e:
-            _logger.error(f"AI Classification error: {str(e)}")
-            return {'error': str(e)}
+        content, content_type = self._get_document_content(document)
+        loop = asyncio.get_running_loop()
 
-    def _classify_openai(self, content, content_type):
-        """Classify using OpenAI GPT-4 Vision"""
-        try:
-            import openai
-        except ImportError:
-            return {'error': 'openai package not installed'}
+        if self._use_preclassifier(content_type):
+            start_time = time.time()
+            endpoint, payload = self._preclassifier_request(content, content_type)
+            try:
+                local_result = await loop.run_in_executor(
+                    None, self._post_local, endpoint, payload, PRECLASSIFIER_TIMEOUT, False
+                )
+            except Exception as e:
+                _logger.warning(f"Local pre-classification failed ({self.name}): {e}")
+                attempts.append(self._attempt_info(start_time, str(e), provider='local'))
+            else:
+                result = self._accept_preclassification(local_result, start_time, attempts)
+                if result is not None:
+                    return result
+
+        return await self._classify_with_fallback_async(
+            content, content_type, self | self.fallback_service_ids, attempts,
+            attachment, clients if clients is not None else {},
+        )
 
-        client = openai.OpenAI(api_key=self.api_key)
+    async def _classify_once_async(self, content, content_type, client):
+        """Classify content with this service's provider without blocking the loop
 
+        Only providers without any network call (missing package, Azure
+        placeholder) use the blocking path.
+        """
+        self.ensure_one()
+        if self.provider == 'openai' and client:
+            response = await client.chat.completions.create(
+                **self._openai_request(content, content_type)
+            )
+            return self._parse_json_response(response.choices[0].message.content)
+        elif self.provider == 'claude' and client:
+            return await self._classify_claude_async(client, content, content_type)
+        elif self.provider == 'local' and requests is not None:
+            endpoint, payload = self._local_request(content, content_type)
+            # requests is blocking, keep it off the event loop
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._post_local, endpoint, payload
+            )
+        return self._classify_once(content, content_type)
+
+    async def _classify_with_fallback_async(self, content, content_type, services, attempts,
+                                            attachment, clients):
+        """Async counterpart of _classify_with_fallback
+
+        :param clients: async SDK clients by service id, shared by the queue
+                        run; clients of fallback services are added on first use
+        """
+        result = {'error': 'No AI classification service available'}
+
+        for service in services:
+            if service.id not in clients:
+                clients[service.id] = service._get_async_client()
+            start_time = time.time()
+            try:
+                result = await service._classify_once_async(
+                    content, content_type, clients[service.id]
+                )
+            except Exception as e:
+                _logger.error(f"AI Classification error ({service.name}): {str(e)}")
+                result = {'error': str(e)}
+                attempts.append(service._attempt_info(start_time, result['error']))
+                if service._is_retryable_error(e):
+                    continue
+                break
+
+            attempts.append(service._attempt_info(start_time, result.get('error')))
+
+            # Update statistics
+            service._update_statistics(result)
+            service._store_cached_classification(attachment, result)
+            break
+
+        result['attempts'] = attempts
+        return result
+
+    def _image_media_type(self, content):
+        """Sniff the media type of raw image bytes"""
+        if content.startswith(b'\x89PNG'):
+            return 'image/png'
+        elif content.startswith(b'GIF8'):
+            return 'image/gif'
+        elif content[:4] == b'RIFF' and content[8:12] == b'WEBP':
+            return 'image/webp'
+        return 'image/jpeg'
+
+    def _image_base64(self, content):
+        """Base64-encode raw image bytes for APIs that only accept inline data"""
+        return base64.b64encode(content).decode('ascii')
+
+    def _parse_json_response(self, text):
+        """Parse the JSON classification returned by a provider"""
+        try:
+            return json_loads(text)
+        except json.JSONDecodeError:
+            return {'raw_response': text}
+
+    def _openai_request(self, content, content_type):
+        """Build the chat completion arguments for OpenAI"""
         messages = [{
             "role": "user",
             "content": [
@@ -158,93 +895,252 @@ German document types to detect:
         if content_type == 'image':
             messages[0]["content"].append({
                 "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{content}"}
+                "image_url": {"url": f"data:{self._image_media_type(content)};base64,"
+                                      f"{self._image_base64(content)}"}
             })
 
+        return {
+            'model': self.model_name or "gpt-4-vision-preview",
+            'messages': messages,
+            'max_tokens': 1000,
+        }
+
+    def _classify_openai(self, content, content_type):
+        """Classify using OpenAI GPT-4 Vision"""
+        if openai is None:
+            return {'error': 'openai package not installed'}
+
+        client = self._get_client()
+
         response = client.chat.completions.create(
-            model=self.model_name or "gpt-4-vision-preview",
-            messages=messages,
-            max_tokens=1000,
+            **self._openai_request(content, content_type)
         )
 
-        import json
-        try:
-            return json.loads(response.choices[0].message.content)
-        except json.JSONDecodeError:
-            return {'raw_response': response.choices[0].message.content}
+        return self._parse_json_response(response.choices[0].message.content)
 
-    def _classify_claude(self, content, content_type):
-        """Classify using Anthropic Claude"""
-        try:
-            import anthropic
-        except ImportError:
-            return {'error': 'anthropic package not installed'}
-
-        client = anthropic.Anthropic(api_key=self.api_key)
+    def _claude_request(self, content, content_type, file_id=None):
+        """Build the messages API arguments for Anthropic Claude
 
-        message_content = [{"type": "text", "text": self._get_classification_prompt()}]
+        Images are referenced by ``file_id`` when they were uploaded through
+        the Files API, otherwise they are inlined as base64.
+        """
+        # The prompt is identical for every document, let Anthropic cache it
+        message_content = [{
+            "type": "text",
+            "text": self._get_classification_prompt(),
+            "cache_control": {"type": "ephemeral"},
+        }]
 
-        if content_type == 'image':
+        if content_type == 'image' and file_id:
+            message_content.append({
+                "type": "image",
+                "source": {"type": "file", "file_id": file_id},
+            })
+        elif content_type == 'image':
             message_content.append({
                 "type": "image",
                 "source": {
                     "type": "base64",
-                    "media_type": "image/jpeg",
-                    "data": content,
+                    "media_type": self._image_media_type(content),
+                    "data": self._image_base64(content),
                 }
             })
 
-        response = client.messages.create(
-            model=self.model_name or "claude-3-sonnet-20240229",
-            max_tokens=1000,
-            messages=[{"role": "user", "content": message_content}]
+        return {
+            'model': self.model_name or "claude-3-sonnet-20240229",
+            'max_tokens': 1000,
+            'messages': [{"role": "user", "content": message_content}],
+        }
+
+    def _classify_claude(self, content, content_type):
+        """Classify using Anthropic Claude"""
+        if anthropic is None:
+            return {'error': 'anthropic package not installed'}
+
+        client = self._get_client()
+
+        if not self._use_claude_files_api(client, content, content_type):
+            response = client.messages.create(**self._claude_request(content, content_type))
+            return self._parse_json_response(response.content[0].text)
+
+        uploaded = client.beta.files.upload(
+            file=('document', content, self._image_media_type(content)),
         )
+        try:
+            response = client.beta.messages.create(
+                betas=[CLAUDE_FILES_BETA],
+                **self._claude_request(content, content_type, file_id=uploaded.id)
+            )
+        finally:
+            try:
+                client.beta.files.delete(uploaded.id)
+            except Exception as e:
+                _logger.warning(f"Could not delete uploaded file {uploaded.id}: {e}")
 
-        import json
+        return self._parse_json_response(response.content[0].text)
+
+    async def _classify_claude_async(self, client, content, content_type):
+        """Async variant of _classify_claude on a shared AsyncAnthropic client"""
+        if not self._use_claude_files_api(client, content, content_type):
+            response = await client.messages.create(**self._claude_request(content, content_type))
+            return self._parse_json_response(response.content[0].text)
+
+        uploaded = await client.beta.files.upload(
+            file=('document', content, self._image_media_type(content)),
+        )
         try:
-            return json.loads(response.content[0].text)
-        except json.JSONDecodeError:
-            return {'raw_response': response.content[0].text}
+            response = await client.beta.messages.create(
+                betas=[CLAUDE_FILES_BETA],
+                **self._claude_request(content, content_type, file_id=uploaded.id)
+            )
+        finally:
+            try:
+                await client.beta.files.delete(uploaded.id)
+            except Exception as e:
+                _logger.warning(f"Could not delete uploaded file {uploaded.id}: {e}")
+
+        return self._parse_json_response(response.content[0].text)
+
+    def _use_claude_files_api(self, client, content, content_type):
+        """Whether an image is too large to inline and the SDK can upload it"""
+        return (
+            content_type == 'image'
+            and len(content) > CLAUDE_INLINE_IMAGE_MAX_BYTES
+            and hasattr(getattr(client, 'beta', None), 'files')
+        )
+
+    def _submit_batch(self, batch_requests):
+        """Submit classification requests through the provider batch API
+
+        :param batch_requests: list of (custom_id, content, content_type)
+        :return: provider batch id
+        """
+        self.ensure_one()
+        if self.provider == 'openai':
+            client = self._get_client()
+            buffer = io.BytesIO()
+            for custom_id, content, content_type in batch_requests:
+                buffer.write(json_dumps({
+                    'custom_id': custom_id,
+                    'method': 'POST',
+                    'url': '/v1/chat/completions',
+                    'body': self._openai_request(content, content_type),
+                }).encode('utf-8'))
+                buffer.write(b'\n')
+            batch_file = client.files.create(
+                file=('classification_batch.jsonl', buffer.getvalue()),
+                purpose='batch',
+            )
+            batch = client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint='/v1/chat/completions',
+                completion_window='24h',
+            )
+            return batch.id
+        elif self.provider == 'claude':
+            client = self._get_client()
+            batch = client.messages.batches.create(requests=[{
+                'custom_id': custom_id,
+                'params': self._claude_request(content, content_type),
+            } for custom_id, content, content_type in batch_requests])
+            return batch.id
+        raise UserError(_('Provider %s does not support batch processing.') % self.provider)
+
+    def _fetch_batch_results(self, batch_ref):
+        """Return {custom_id: classification} for a finished batch, None while it runs
+
+        Requests missing from the returned dict failed without a result.
+        """
+        self.ensure_one()
+        results = {}
+
+        if self.provider == 'openai':
+            client = self._get_client()
+            batch = client.batches.retrieve(batch_ref)
+            if batch.status in ('validating', 'in_progress', 'finalizing', 'cancelling'):
+                return None
+
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for line in client.files.content(file_id).text.splitlines():
+                    if not line.strip():
+                        continue
+                    row = json_loads(line)
+                    response = row.get('response') or {}
+                    if row.get('error') or response.get('status_code') != 200:
+                        error = row.get('error') or response.get('body', {}).get('error')
+                        results[row['custom_id']] = {'error': str(error or f'Batch {batch.status}')}
+                    else:
+                        message = response['body']['choices'][0]['message']['content']
+                        results[row['custom_id']] = self._parse_json_response(message)
+
+        elif self.provider == 'claude':
+            client = self._get_client()
+            batch = client.messages.batches.retrieve(batch_ref)
+            if batch.processing_status != 'ended':
+                return None
+
+            for entry in client.messages.batches.results(batch_ref):
+                if entry.result.type == 'succeeded':
+                    results[entry.custom_id] = self._parse_json_response(
+                        entry.result.message.content[0].text
+                    )
+                else:
+                    results[entry.custom_id] = {'error': f'Batch request {entry.result.type}'}
+
+        return results
 
     def _classify_azure(self, content, content_type):
         """Classify using Azure Document Intelligence"""
         # Placeholder for Azure implementation
         return {'error': 'Azure integration pending'}
 
-    def _classify_local(self, content, content_type):
-        """Classify using local Ollama model"""
-        try:
-            import requests
-        except ImportError:
-            return {'error': 'requests package not installed'}
-
-        endpoint = self.api_endpoint or 'http://localhost:11434/api/generate'
-
-        response = requests.post(endpoint, json={
-            'model': self.model_name or 'llava',
+    def _local_request(self, content, content_type, endpoint=None, model=None):
+        """Return the (endpoint, payload) pair for the local Ollama API"""
+        endpoint = endpoint or self.api_endpoint or 'http://localhost:11434/api/generate'
+        return endpoint, {
+            'model': model or self.model_name or 'llava',
             'prompt': self._get_classification_prompt(),
-            'images': [content] if content_type == 'image' else [],
+            'images': [self._image_base64(content)] if content_type == 'image' else [],
             'stream': False,
-        })
+        }
 
-        import json
+    def _parse_local_response(self, response):
+        """Parse an Ollama generate response"""
         try:
-            result = response.json()
-            return json.loads(result.get('response', '{}'))
+            result = json_loads(response.content)
+            return json_loads(result.get('response', '{}'))
         except (json.JSONDecodeError, KeyError):
             return {'raw_response': response.text}
 
+    def _classify_local(self, content, content_type):
+        """Classify using local Ollama model"""
+        if requests is None:
+            return {'error': 'requests package not installed'}
+
+        return self._post_local(*self._local_request(content, content_type))
+
     def apply_classification(self, document, classification):
         """Apply classification results to document"""
+        values = self._prepare_classification_values(classification)
+        if values:
+            document.write(values)
+            return True
+
+        return False
+
+    def _prepare_classification_values(self, classification):
+        """Return the document values for a classification, {} if not applicable"""
         self.ensure_one()
 
         if 'error' in classification:
-            return False
+            return {}
 
         confidence = classification.get('confidence', 0)
         if confidence < self.confidence_threshold:
             _logger.info(f"Confidence {confidence} below threshold {self.confidence_threshold}")
-            return False
+            return {}
 
         values = {}
 
@@ -287,26 +1183,82 @@ German document types to detect:
             if tag_ids:
                 values['tag_ids'] = [(4, tid) for tid in tag_ids]
 
-        if values:
-            document.write(values)
-            return True
-
-        return False
+        return values
 
     def _get_or_create_tags(self, tag_names):
         """Get existing tags or create new ones"""
-        Tag = self.env['documents.tag']
-        tag_ids = []
+        names = [name.strip().lower() for name in tag_names[:5]  # Limit to 5 tags
+                 if isinstance(name, str) and name.strip()]
+        if not names:
+            return []
 
-        for name in tag_names[:5]:  # Limit to 5 tags
-            tag = Tag.search([('name', 'ilike', name)], limit=1)
-            if tag:
+        # One query for all names instead of one ilike search per name
+        domain = ['|'] * (len(names) - 1) + [('name', 'ilike', name) for name in names]
+        tags = self.env['documents.tag'].search(domain)
+
+        tag_ids = []
+        for name in names:
+            tag = next((t for t in tags if name in (t.name or '').lower()), None)
+            if tag and tag.id not in tag_ids:
                 tag_ids.append(tag.id)
             # Don't auto-create tags - only use existing ones
 
         return tag_ids
 
 
+class AIClassificationCache(models.Model):
+    """Classification results keyed on attachment content"""
+
+    _name = 'dms.ai.classification.cache'
+    _description = 'AI Classification Cache'
+    _order = 'create_date desc'
+
+    key = fields.Char(
+        string='Content Checksum',
+        required=True,
+        index=True,
+    )
+    provider = fields.Char(string='Provider')
+    model_name = fields.Char(string='Model Name')
+    prompt_version = fields.Integer(string='Prompt Version')
+    result_json = fields.Text(string='Result', required=True)
+
+    def init(self):
+        # Keep the newest of duplicates written before the index existed
+        self.env.cr.execute(f"""
+            DELETE FROM {self._table} AS cache
+             USING {self._table} AS newer
+             WHERE newer.key = cache.key
+               AND newer.provider = cache.provider
+               AND COALESCE(newer.model_name, '') = COALESCE(cache.model_name, '')
+               AND newer.prompt_version = cache.prompt_version
+               AND newer.id > cache.id
+        """)
+        tools.create_unique_index(
+            self.env.cr, 'dms_ai_classification_cache_key_uniq', self._table,
+            ['key', 'provider', "COALESCE(model_name, '')", 'prompt_version'],
+        )
+
+    @api.autovacuum
+    def _gc_stale_entries(self):
+        """Drop outdated entries
+
+        Removes entries of an older classification prompt, entries older
+        than CLASSIFICATION_CACHE_MAX_AGE_DAYS and entries whose content no
+        longer belongs to any attachment, e.g. after a retention deletion.
+        """
+        self.env.cr.execute(f"""
+            DELETE FROM {self._table} AS cache
+             WHERE cache.prompt_version IS DISTINCT FROM %s
+                OR cache.create_date < %s
+                OR NOT EXISTS (
+                       SELECT 1 FROM ir_attachment
+                        WHERE ir_attachment.checksum = cache.key)
+        """, (PROMPT_VERSION,
+              fields.Datetime.now() - timedelta(days=CLASSIFICATION_CACHE_MAX_AGE_DAYS)))
+        self.invalidate_model()
+
+
 class AIClassificationLog(models.Model):
     """Log of AI classification results"""
 
@@ -333,3 +1285,7 @@ class AIClassificationLog(models.Model):
     applied = fields.Boolean(string='Applied to Document')
     error_message = fields.Text(string='Error')
     processing_time = fields.Float(string='Processing Time (s)')
+    provider_attempts = fields.Text(
+        string='Provider Attempts',
+        help='Provider, latency and error of every service tried, as JSON',
+    )
@@ -1,13 +1,24 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import logging
 import time
 from datetime import datetime, timedelta
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError
 
+from .ai_classification_service import BATCH_MAX_REQUESTS, BATCH_MAX_BYTES, json_dumps
+
 _logger = logging.getLogger(__name__)
 
+# Below this many items the cron classifies sequentially, an event loop
+# only pays off once several provider round-trips can overlap
+CONCURRENCY_THRESHOLD = 3
+
+# Items flagged for a batch submission that never got a batch ref after this
+# long were lost with their worker (e.g. killed by a time limit on upload)
+STALE_PROCESSING_MINUTES = 60
+
 
 class DocumentProcessingQueue(models.Model):
     """Queue for batch document processing with AI classification"""
@@ -28,12 +39,14 @@ class DocumentProcessingQueue(models.Model):
         string='Document',
         required=True,
         ondelete='cascade',
+        index=True,
     )
 
     service_id = fields.Many2one(
         'dms.ai.classification.service',
         string='AI Service',
         required=True,
+        index=True,
     )
 
     state = fields.Selection([
@@ -65,6 +78,13 @@ class DocumentProcessingQueue(models.Model):
     result_message = fields.Text(string='Result Message', readonly=True)
     error_message = fields.Text(string='Error Message', readonly=True)
 
+    batch_ref = fields.Char(
+        string='Provider Batch',
+        readonly=True,
+        index=True,
+        help='Provider batch the item was submitted to, if processed through the Batch API',
+    )
+
     log_id = fields.Many2one(
         'dms.ai.classification.log',
         string='Classification Log',
@@ -78,82 +98,150 @@ class DocumentProcessingQueue(models.Model):
         store=True,
     )
 
+    def init(self):
+        super().init()
+        # Partial index matching the cron pick; only pending rows are indexed
+        tools.create_index(
+            self.env.cr,
+            'dms_document_processing_queue_pending_idx',
+            self._table,
+            ['priority DESC', 'scheduled_date'],
+            where="state = 'pending'",
+        )
+
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('name', _('New')) == _('New'):
-                vals['name'] = self.env['ir.sequence'].next_by_code(
-                    'dms.document.processing.queue'
-                ) or _('New')
+        new_name = _('New')
+        unnamed = [vals for vals in vals_list if vals.get('name', new_name) == new_name]
+        if unnamed:
+            # Resolve the sequence once for the batch (same lookup as
+            # next_by_code) and only draw the numbers per record
+            sequence = self.env['ir.sequence'].search([
+                ('code', '=', 'dms.document.processing.queue'),
+                ('company_id', 'in', [self.env.company.id, False]),
+            ], order='company_id', limit=1)
+            for vals, name in zip(unnamed, self._next_names(sequence, len(unnamed))):
+                vals['name'] = name
         return super().create(vals_list)
 
+    @api.model
+    def _next_names(self, sequence, count):
+        """Draw count references from the sequence
+
+        A standard sequence without date ranges is a plain PostgreSQL
+        sequence, so all numbers are allocated in one statement and only
+        formatted here; other sequences draw number by number.
+        """
+        if not sequence:
+            return [_('New')] * count
+        if sequence.implementation != 'standard' or sequence.use_date_range:
+            return [sequence._next() for _i in range(count)]
+        self.env.cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            ('ir_sequence_%03d' % sequence.id, count),
+        )
+        return [sequence.get_next_char(number) for number, in self.env.cr.fetchall()]
+
+    def _start_processing(self):
+        """Mark queue items as being processed and count the attempt
+
+        A single UPDATE for the whole recordset; the outcome is written
+        later together with the log link.
+        """
+        if not self:
+            return
+        self.flush_recordset(['state', 'started_date', 'attempts'])
+        self.env.cr.execute("""
+            UPDATE dms_document_processing_queue
+               SET state = 'processing',
+                   started_date = %s,
+                   attempts = attempts + 1
+             WHERE id IN %s
+        """, (fields.Datetime.now(), tuple(self.ids)))
+        self.invalidate_recordset(['state', 'started_date', 'attempts'])
+
+    def _get_failure_vals(self, error, retry=True):
+        """Values rescheduling or failing the item after an unsuccessful attempt"""
+        self.ensure_one()
+        retry = retry and self.attempts < self.max_attempts
+        return {
+            'state': 'pending' if retry else 'failed',
+            'error_message': error,
+            'scheduled_date': fields.Datetime.now() + timedelta(minutes=5 * self.attempts),
+        }
+
+    def _record_failure(self, error):
+        """Reschedule or fail the item after an unsuccessful attempt"""
+        self.ensure_one()
+        self.write(self._get_failure_vals(error))
+
+    def _record_result(self, result, processing_time):
+        """Store a classification result on the item and log it
+
+        The log is created first so the item is updated with one write.
+        """
+        self.ensure_one()
+
+        result = dict(result)
+        attempts = result.pop('attempts', None)
+        retry = not result.pop('non_retryable', False)
+
+        # Create log entry
+        log_vals = {
+            'document_id': self.document_id.id,
+            'service_id': self.service_id.id,
+            'processing_time': processing_time,
+            'provider_attempts': json_dumps(attempts) if attempts else False,
+        }
+
+        if 'error' in result:
+            log_vals.update({
+                'error_message': result['error'],
+                'applied': False,
+            })
+            vals = self._get_failure_vals(result['error'], retry=retry)
+        else:
+            # Apply classification to document
+            applied = self.service_id.apply_classification(
+                self.document_id, result
+            )
+
+            log_vals.update({
+                'classification_result': json_dumps(result),
+                'confidence': result.get('confidence', 0),
+                'document_type': result.get('document_type', ''),
+                'applied': applied,
+            })
+
+            vals = {
+                'state': 'done',
+                'completed_date': fields.Datetime.now(),
+                'result_message': f"Classification: {result.get('document_type', 'Unknown')} "
+                                 f"(Confidence: {result.get('confidence', 0):.1%})",
+            }
+
+        log = self.env['dms.ai.classification.log'].create(log_vals)
+        vals['log_id'] = log.id
+        self.write(vals)
+
     def action_process(self):
         """Process this queue item immediately"""
         self.ensure_one()
         if self.state not in ['pending', 'failed']:
             return
 
-        self.write({
-            'state': 'processing',
-            'started_date': fields.Datetime.now(),
-            'attempts': self.attempts + 1,
-        })
+        self._start_processing()
 
         start_time = time.time()
 
         try:
             # Perform AI classification
             result = self.service_id.classify_document(self.document_id)
-
-            processing_time = time.time() - start_time
-
-            # Create log entry
-            log_vals = {
-                'document_id': self.document_id.id,
-                'service_id': self.service_id.id,
-                'processing_time': processing_time,
-            }
-
-            if 'error' in result:
-                log_vals.update({
-                    'error_message': result['error'],
-                    'applied': False,
-                })
-                self.write({
-                    'state': 'failed' if self.attempts >= self.max_attempts else 'pending',
-                    'error_message': result['error'],
-                    'scheduled_date': fields.Datetime.now() + timedelta(minutes=5 * self.attempts),
-                })
-            else:
-                # Apply classification to document
-                applied = self.service_id.apply_classification(
-                    self.document_id, result
-                )
-
-                log_vals.update({
-                    'classification_result': str(result),
-                    'confidence': result.get('confidence', 0),
-                    'document_type': result.get('document_type', ''),
-                    'applied': applied,
-                })
-
-                self.write({
-                    'state': 'done',
-                    'completed_date': fields.Datetime.now(),
-                    'result_message': f"Classification: {result.get('document_type', 'Unknown')} "
-                                     f"(Confidence: {result.get('confidence', 0):.1%})",
-                })
-
-            log = self.env['dms.ai.classification.log'].create(log_vals)
-            self.log_id = log.id
+            self._record_result(result, time.time() - start_time)
 
         except Exception as e:
             _logger.exception(f"Queue processing error: {e}")
-            self.write({
-                'state': 'failed' if self.attempts >= self.max_attempts else 'pending',
-                'error_message': str(e),
-                'scheduled_date': fields.Datetime.now() + timedelta(minutes=5 * self.attempts),
-            })
+            self._record_failure(str(e))
 
     def action_cancel(self):
         """Cancel this queue item"""
@@ -165,29 +253,270 @@ class DocumentProcessingQueue(models.Model):
             'state': 'pending',
             'attempts': 0,
             'error_message': False,
+            'batch_ref': False,
             'scheduled_date': fields.Datetime.now(),
         })
 
     @api.model
-    def _cron_process_queue(self, limit=10):
-        """Cron job to process pending queue items"""
-        items = self.search([
+    def _cron_process_queue(self, limit=10, priorities=None):
+        """Cron job to process pending queue items
+
+        :param priorities: only process items with these priorities; each
+            priority has its own cron so urgent documents are not stuck
+            behind a bulk import
+        """
+        self._drain_batches(priorities)
+
+        domain = [
             ('state', '=', 'pending'),
             ('scheduled_date', '<=', fields.Datetime.now()),
-        ], limit=limit, order='priority desc, scheduled_date asc')
+            # Low/normal items go to the batch drain, but only for providers
+            # _drain_batches can actually submit
+            '|', '|', ('priority', 'in', ['2', '3']),
+            ('service_id.use_batch_api', '=', False),
+            ('service_id.provider', 'not in', ['openai', 'claude']),
+        ]
+        if priorities:
+            domain.append(('priority', 'in', list(priorities)))
+        items = self.search(
+            domain, limit=limit, order='priority desc, scheduled_date asc',
+        )._lock_for_processing()
 
         _logger.info(f"Processing {len(items)} queue items")
 
+        if len(items) >= CONCURRENCY_THRESHOLD:
+            return asyncio.run(self._process_items_async(items))
+
+        # A savepoint per item isolates failures, one commit for the batch
         for item in items:
             try:
-                item.action_process()
-                self.env.cr.commit()  # Commit after each item
+                with self.env.cr.savepoint():
+                    item.action_process()
+            except Exception as e:
+                _logger.exception(f"Cron processing error for {item.name}: {e}")
+        self.env.cr.commit()
+
+        return True
+
+    def _lock_for_processing(self):
+        """Lock the items for this transaction, skipping those another cron holds"""
+        if not self:
+            return self
+        self.env.cr.execute("""
+            SELECT id FROM dms_document_processing_queue
+             WHERE id IN %s
+               FOR UPDATE SKIP LOCKED
+        """, (tuple(self.ids),))
+        locked = {row[0] for row in self.env.cr.fetchall()}
+        return self.filtered(lambda item: item.id in locked)
+
+    async def _process_items_async(self, items):
+        """Classify queue items concurrently, bounded per service
+
+        Provider round-trips overlap in the event loop while every ORM call
+        stays in the cron thread. Results are written in a post-pass, each
+        item in its own savepoint so one failure does not undo the rest;
+        the whole run is committed once at the end.
+        """
+        items._start_processing()
+
+        batches = await asyncio.gather(*[
+            self._classify_items_async(service, service_items)
+            for service, service_items in items.grouped('service_id').items()
+        ])
+
+        for item, result, processing_time in (row for batch in batches for row in batch):
+            try:
+                with self.env.cr.savepoint():
+                    if isinstance(result, Exception):
+                        item._record_failure(str(result))
+                    else:
+                        item._record_result(result, processing_time)
             except Exception as e:
                 _logger.exception(f"Cron processing error for {item.name}: {e}")
-                self.env.cr.rollback()
+                # The rollback left the item in processing; reschedule or fail it
+                try:
+                    with self.env.cr.savepoint():
+                        item._record_failure(str(e))
+                except Exception:
+                    _logger.exception(f"Could not record the failure of {item.name}")
+        self.env.cr.commit()
 
         return True
 
+    async def _classify_items_async(self, service, items):
+        """Classify the items of one service, at most max_concurrency at a time
+
+        Returns a list of (item, result, processing_time) tuples; result is
+        the raised exception if the classification crashed.
+        """
+        clients = {service.id: service._get_async_client()}
+        semaphore = asyncio.Semaphore(max(service.max_concurrency, 1))
+
+        async def classify(item):
+            async with semaphore:
+                start_time = time.time()
+                try:
+                    result = await service._classify_document_async(item.document_id, clients)
+                except Exception as e:
+                    _logger.exception(f"Queue processing error: {e}")
+                    result = e
+                return item, result, time.time() - start_time
+
+        try:
+            return await asyncio.gather(*[classify(item) for item in items])
+        finally:
+            for client in clients.values():
+                if client:
+                    await client.close()
+
+    @api.model
+    def _drain_batches(self, priorities=None):
+        """Submit pending low/normal priority items of batch-enabled services
+
+        Urgent and high priority items always take the synchronous path.
+        Candidates are locked and flagged as processing in a committed step
+        before any provider call, so crons running in parallel never submit
+        the same item twice.
+        """
+        batch_priorities = [p for p in priorities or ['0', '1'] if p in ('0', '1')]
+        if not batch_priorities:
+            return
+
+        items = self.search([
+            ('state', '=', 'pending'),
+            ('scheduled_date', '<=', fields.Datetime.now()),
+            ('priority', 'in', batch_priorities),
+            ('service_id.use_batch_api', '=', True),
+            ('service_id.provider', 'in', ['openai', 'claude']),
+        ], limit=BATCH_MAX_REQUESTS, order='priority desc, scheduled_date asc')._lock_for_processing()
+        if not items:
+            return
+
+        items._start_processing()
+        self.env.cr.commit()
+
+        for service, service_items in items.grouped('service_id').items():
+            self._drain_batch(service, service_items)
+
+    @api.model
+    def _drain_batch(self, service, items):
+        """Submit items to the provider batch API, chunked to its limits
+
+        The items are already flagged as processing by _drain_batches.
+        """
+        chunk, requests, size = self.browse(), [], 0
+
+        for item in items:
+            if not item.document_id.attachment_ids:
+                item._record_result({'error': 'No attachment found'}, 0)
+                continue
+            error = service._precheck(item.document_id.attachment_ids[0])
+            if error:
+                item._record_result({'error': error, 'non_retryable': True}, 0)
+                continue
+            cached = service._get_cached_classification(item.document_id.attachment_ids[0])
+            if cached:
+                item._record_result(cached, 0)
+                continue
+            content, content_type = service._get_document_content(item.document_id)
+            # Images end up base64-encoded in the batch file
+            content_size = len(content) * 4 // 3 if content_type == 'image' else 0
+            if requests and (len(requests) >= BATCH_MAX_REQUESTS
+                             or size + content_size > BATCH_MAX_BYTES):
+                self._submit_batch_chunk(service, chunk, requests)
+                chunk, requests, size = self.browse(), [], 0
+            # Anthropic only accepts [a-zA-Z0-9_-] in custom ids, so use the id
+            requests.append((str(item.id), content, content_type))
+            chunk |= item
+            size += content_size
+
+        if requests:
+            self._submit_batch_chunk(service, chunk, requests)
+
+    @api.model
+    def _submit_batch_chunk(self, service, items, requests):
+        """Submit one chunk and link its items to the provider batch"""
+        try:
+            batch_ref = service._submit_batch(requests)
+        except Exception as e:
+            _logger.exception(f"Batch submission error for {service.name}: {e}")
+            for item in items:
+                item._record_failure(str(e))
+            self.env.cr.commit()
+            return
+
+        items.write({'batch_ref': batch_ref})
+        self.env.cr.commit()
+        _logger.info(f"Submitted {len(items)} queue items in batch {batch_ref}")
+
+    @api.model
+    def _cron_poll_batches(self):
+        """Cron job to collect the results of submitted provider batches"""
+        self._reap_stale_items()
+
+        items = self.search([
+            ('state', '=', 'processing'),
+            ('batch_ref', '!=', False),
+        ])
+
+        for batch_ref, batch_items in items.grouped('batch_ref').items():
+            service = batch_items[0].service_id
+            try:
+                results = service._fetch_batch_results(batch_ref)
+            except Exception as e:
+                _logger.exception(f"Batch polling error for {batch_ref}: {e}")
+                continue
+            if results is None:
+                continue
+
+            now = fields.Datetime.now()
+            for item in batch_items:
+                try:
+                    with self.env.cr.savepoint():
+                        result = results.get(str(item.id)) or {'error': f'No result in batch {batch_ref}'}
+                        item.batch_ref = False
+                        item._record_result(result, (now - item.started_date).total_seconds())
+                        if 'error' not in result:
+                            service._update_statistics(result)
+                            if item.document_id.attachment_ids:
+                                service._store_cached_classification(
+                                    item.document_id.attachment_ids[0], result
+                                )
+                except Exception as e:
+                    _logger.exception(f"Batch result error for {item.name}: {e}")
+                    # The rollback restored batch_ref; without clearing it every
+                    # poll would download the batch and fail again
+                    try:
+                        with self.env.cr.savepoint():
+                            item.write(dict(
+                                item._get_failure_vals(str(e), retry=False),
+                                batch_ref=False,
+                            ))
+                    except Exception:
+                        _logger.exception(f"Could not record the failure of {item.name}")
+            self.env.cr.commit()
+
+        return True
+
+    @api.model
+    def _reap_stale_items(self):
+        """Reschedule items stuck in processing without a provider batch
+
+        _drain_batches commits its candidates as processing before the
+        submission; if the worker dies before the batch ref is written
+        no cron would ever pick them up again.
+        """
+        items = self.search([
+            ('state', '=', 'processing'),
+            ('batch_ref', '=', False),
+            ('started_date', '<', fields.Datetime.now() - timedelta(minutes=STALE_PROCESSING_MINUTES)),
+        ])._lock_for_processing()
+        for item in items:
+            _logger.warning(f"Rescheduling stale queue item {item.name}")
+            item._record_failure(_('Processing was interrupted'))
+        self.env.cr.commit()
+
     @api.model
     def add_documents_to_queue(self, document_ids, service_id, priority='1'):
         """Add multiple documents to processing queue"""
@@ -200,14 +529,16 @@ class DocumentProcessingQueue(models.Model):
                 raise UserError(_('No active AI classification service configured.'))
             service_id = service.id
 
+        # One duplicate check for the whole batch
+        queued = set(self.search([
+            ('document_id', 'in', list(document_ids)),
+            ('state', 'in', ['pending', 'processing']),
+        ]).document_id.ids)
+
         queue_items = []
         for doc_id in document_ids:
-            # Check if already in queue
-            existing = self.search([
-                ('document_id', '=', doc_id),
-                ('state', 'in', ['pending', 'processing']),
-            ], limit=1)
-            if not existing:
+            if doc_id not in queued:
+                queued.add(doc_id)
                 queue_items.append({
                     'document_id': doc_id,
                     'service_id': service_id,
@@ -230,11 +561,15 @@ class DocumentsDocumentAI(models.Model):
     )
 
     def _compute_ai_classification_count(self):
-        Log = self.env['dms.ai.classification.log']
+        # One grouped count for the whole recordset instead of one per document
+        counts = {
+            document.id: count
+            for document, count in self.env['dms.ai.classification.log']._read_group(
+                [('document_id', 'in', self.ids)], ['document_id'], ['__count'],
+            )
+        }
         for doc in self:
-            doc.ai_classification_count = Log.search_count([
-                ('document_id', '=', doc.id)
-            ])
+            doc.ai_classification_count = counts.get(doc.id, 0)
 
     def action_classify_ai(self):
         """Classify this document using AI"""
@@ -247,16 +582,20 @@ class DocumentsDocumentAI(models.Model):
             raise UserError(_('No active AI classification service configured. '
                             'Please configure one in Property DMS > Configuration > AI Classification.'))
 
-        result = service.classify_document(self)
+        # An explicit request re-classifies even previously seen content
+        result = service.with_context(dms_ai_skip_cache=True).classify_document(self)
 
         if 'error' in result:
             raise UserError(_('Classification failed: %s') % result['error'])
 
+        attempts = result.pop('attempts', None)
+
         # Log the result
         self.env['dms.ai.classification.log'].create({
             'document_id': self.id,
             'service_id': service.id,
-            'classification_result': str(result),
+            'provider_attempts': json_dumps(attempts) if attempts else False,
+            'classification_result': json_dumps(result),
             'confidence': result.get('confidence', 0),
             'document_type': result.get('document_type', ''),
             'applied': False,  # Will be set below
@@ -2,6 +2,8 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.fields import Domain
+from odoo.tools import SQL
 from dateutil.relativedelta import relativedelta
 
 
@@ -123,17 +125,76 @@ class DocumentRetentionPolicy(models.Model):
         compute='_compute_upcoming_actions',
     )
 
+    def write(self, vals):
+        # Rewriting a retention setting with its current value would still
+        # queue retention_date of every document under the policy for recompute
+        unchanged = [
+            fname for fname in ('retention_years', 'retention_months', 'retention_trigger')
+            if fname in vals and all(policy[fname] == vals[fname] for policy in self)
+        ]
+        if unchanged:
+            vals = {key: value for key, value in vals.items() if key not in unchanged}
+        return super().write(vals)
+
     @api.depends('tag_ids', 'folder_ids')
     def _compute_document_count(self):
-        """Count documents matching this policy"""
+        """Count documents matching this policy
+
+        One statement for all policies: each policy's tags and folders are
+        passed as arrays and PostgreSQL counts the distinct documents per
+        policy, among those the user can see in the union of all scopes.
+        """
+        scoped = self.filtered(lambda p: p.tag_ids or p.folder_ids)
+        (self - scoped).document_count = 0
+        if not scoped:
+            return
+
         Document = self.env['documents.document']
-        for policy in self:
-            domain = []
-            if policy.tag_ids:
-                domain.append(('tag_ids', 'in', policy.tag_ids.ids))
-            if policy.folder_ids:
-                domain.append(('folder_id', 'in', policy.folder_ids.ids))
-            policy.document_count = Document.search_count(domain) if domain else 0
+        tag_field = Document._fields['tag_ids']
+        documents = Document._search(
+            Domain.OR(policy._get_document_domain() for policy in scoped)
+        )
+        scopes = SQL(', ').join(
+            SQL('(%s, %s::int[], %s::int[])', index, policy.tag_ids._origin.ids,
+                policy.folder_ids._origin.ids)
+            for index, policy in enumerate(scoped)
+        )
+        counts = dict(self.env.execute_query(SQL("""
+            SELECT scope.idx, COUNT(DISTINCT doc.id)
+              FROM %(document_table)s AS doc,
+                   (VALUES %(scopes)s) AS scope(idx, tag_ids, folder_ids)
+             WHERE doc.id IN (%(documents)s)
+               AND (cardinality(scope.tag_ids) = 0 OR EXISTS (
+                       SELECT 1 FROM %(tag_rel)s AS rel
+                        WHERE rel.%(rel_document)s = doc.id
+                          AND rel.%(rel_tag)s = ANY(scope.tag_ids)))
+               AND (cardinality(scope.folder_ids) = 0
+                    OR doc.folder_id = ANY(scope.folder_ids))
+             GROUP BY scope.idx
+        """,
+            document_table=SQL.identifier(Document._table),
+            scopes=scopes,
+            documents=documents.subselect(),
+            tag_rel=SQL.identifier(tag_field.relation),
+            rel_document=SQL.identifier(tag_field.column1),
+            rel_tag=SQL.identifier(tag_field.column2),
+        )))
+        for index, policy in enumerate(scoped):
+            policy.document_count = counts.get(index, 0)
+
+    def _get_document_domain(self):
+        """Return the domain of the documents this policy applies to
+
+        The many2many 'in' leaf is compiled by the ORM into an EXISTS
+        semi-join on the tag relation table, so it stays a single query.
+        """
+        self.ensure_one()
+        domain = []
+        if self.tag_ids:
+            domain.append(('tag_ids', 'in', self.tag_ids.ids))
+        if self.folder_ids:
+            domain.append(('folder_id', 'in', self.folder_ids.ids))
+        return domain
 
     def _compute_upcoming_actions(self):
         """Count documents due for retention action in next 90 days"""
@@ -155,11 +216,7 @@ class DocumentRetentionPolicy(models.Model):
     def action_view_documents(self):
         """Open documents matching this policy"""
         self.ensure_one()
-        domain = []
-        if self.tag_ids:
-            domain.append(('tag_ids', 'in', self.tag_ids.ids))
-        if self.folder_ids:
-            domain.append(('folder_id', 'in', self.folder_ids.ids))
+        domain = self._get_document_domain()
 
         return {
             'name': _('Documents - %s') % self.name,
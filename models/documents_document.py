@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api, tools, _
+
+# Retention trigger -> date the retention period starts from
+_TRIGGER_FNS = {
+    'creation': lambda doc: doc.create_date.date() if doc.create_date else False,
+    'document_date': lambda doc: doc.document_date,
+    'fiscal_year_end': lambda doc: doc.document_date.replace(month=12, day=31) if doc.document_date else False,
+}
 
 
 class DocumentsDocument(models.Model):
@@ -54,10 +63,11 @@ class DocumentsDocument(models.Model):
         tracking=True,
     )
 
+    # Generated by PostgreSQL from document_date, see _auto_init
     fiscal_year = fields.Char(
         string='Fiscal Year',
-        compute='_compute_fiscal_year',
-        store=True,
+        readonly=True,
+        copy=False,
     )
 
     # === AI READINESS ===
@@ -66,6 +76,13 @@ class DocumentsDocument(models.Model):
         help='Vendor name extracted by AI/OCR',
     )
 
+    extracted_vendor_norm = fields.Char(
+        string='Normalized Vendor',
+        compute='_compute_extracted_vendor_norm',
+        store=True,
+        help='Lower-cased, trimmed vendor name used for duplicate detection',
+    )
+
     extracted_amount = fields.Monetary(
         string='Extracted Amount',
         currency_field='currency_id',
@@ -93,34 +110,83 @@ class DocumentsDocument(models.Model):
         default=lambda self: self.env.company.currency_id,
     )
 
+    def _auto_init(self):
+        res = super()._auto_init()
+        # fiscal_year is derived by the database, replace the plain column
+        # created by the ORM (or by the former stored compute) once
+        cr = self.env.cr
+        cr.execute("""
+            SELECT is_generated FROM information_schema.columns
+             WHERE table_schema = current_schema()
+               AND table_name = %s AND column_name = 'fiscal_year'
+        """, (self._table,))
+        row = cr.fetchone()
+        if not row or row[0] != 'ALWAYS':
+            cr.execute(f"""
+                ALTER TABLE {self._table} DROP COLUMN IF EXISTS fiscal_year;
+                ALTER TABLE {self._table} ADD COLUMN fiscal_year varchar
+                    GENERATED ALWAYS AS (extract(year from document_date)::int::varchar) STORED
+            """)
+        return res
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        docs = super().create(vals_list)
+        docs.invalidate_recordset(['fiscal_year'])
+        return docs
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'document_date' in vals:
+            # The database derives fiscal_year once the new date is written
+            self.flush_recordset(['document_date'])
+            self.invalidate_recordset(['fiscal_year'])
+        return res
+
+    def init(self):
+        super().init()
+        # Duplicate detection looks documents up by exact (vendor, amount, date)
+        tools.create_index(
+            self.env.cr, 'documents_document_duplicate_idx', self._table,
+            ['extracted_vendor_norm', 'extracted_amount', 'extracted_date'],
+        )
+        # Retention scans only look at dated documents not yet flagged as due
+        tools.create_index(
+            self.env.cr, 'documents_document_retention_due_idx', self._table,
+            ['retention_date'],
+            where='retention_date IS NOT NULL AND retention_action_due IS NOT TRUE',
+        )
+
+    @api.depends('extracted_vendor')
+    def _compute_extracted_vendor_norm(self):
+        for doc in self:
+            doc.extracted_vendor_norm = (doc.extracted_vendor or '').strip().lower() or False
+
     @api.depends('document_date', 'retention_policy_id', 'retention_policy_id.retention_years',
                  'retention_policy_id.retention_months', 'retention_policy_id.retention_trigger')
     def _compute_retention_date(self):
         """Calculate retention date based on policy"""
-        from dateutil.relativedelta import relativedelta
-        for doc in self:
-            if not doc.retention_policy_id:
-                doc.retention_date = False
+        # Load the settings of all involved policies in one query
+        self.retention_policy_id.fetch(['retention_years', 'retention_months', 'retention_trigger'])
+        for policy, docs in self.grouped('retention_policy_id').items():
+            if not policy:
+                docs.retention_date = False
                 continue
 
-            policy = doc.retention_policy_id
-            trigger_date = False
-
-            if policy.retention_trigger == 'creation':
-                trigger_date = doc.create_date.date() if doc.create_date else False
-            elif policy.retention_trigger == 'document_date':
-                trigger_date = doc.document_date
-            elif policy.retention_trigger == 'fiscal_year_end':
-                if doc.document_date:
-                    trigger_date = doc.document_date.replace(month=12, day=31)
-
-            if trigger_date:
-                doc.retention_date = trigger_date + relativedelta(
-                    years=policy.retention_years,
-                    months=policy.retention_months
-                )
-            else:
-                doc.retention_date = False
+            # Resolve the policy once per group rather than once per document
+            trigger_fn = _TRIGGER_FNS.get(policy.retention_trigger)
+            if not trigger_fn:
+                # expiry and last_access have no date to start from yet
+                docs.retention_date = False
+                continue
+            delta = relativedelta(
+                years=policy.retention_years,
+                months=policy.retention_months
+            )
+
+            for doc in docs:
+                trigger_date = trigger_fn(doc)
+                doc.retention_date = trigger_date + delta if trigger_date else False
 
     @api.depends('retention_date')
     def _compute_retention_action_due(self):
@@ -131,11 +197,23 @@ class DocumentsDocument(models.Model):
                 doc.retention_date and doc.retention_date <= today
             )
 
-    @api.depends('document_date')
-    def _compute_fiscal_year(self):
-        """Extract fiscal year from document date"""
-        for doc in self:
-            doc.fiscal_year = str(doc.document_date.year) if doc.document_date else False
+    @api.model
+    def _cron_refresh_retention_action_due(self):
+        """Flag documents whose retention date has passed since it was computed
+
+        The stored flag only depends on retention_date, so it is not
+        recomputed when a day goes by; one UPDATE brings all rows up to date.
+        Its predicate matches documents_document_retention_due_idx.
+        """
+        self.flush_model(['retention_date', 'retention_action_due'])
+        self.env.cr.execute(f"""
+            UPDATE {self._table}
+               SET retention_action_due = true
+             WHERE retention_date IS NOT NULL
+               AND retention_action_due IS NOT TRUE
+               AND retention_date <= CURRENT_DATE
+        """)
+        self.invalidate_model(['retention_action_due'])
 
     # === ENTITY LINKING ===
     # Property linking
@@ -194,33 +272,65 @@ class DocumentsDocument(models.Model):
         for doc in self:
             doc.is_duplicate = bool(doc.duplicate_of_id)
 
+    def _batch_check_duplicates(self):
+        """Flag the documents of self that duplicate an older invoice
+
+        Documents match on normalized vendor and amount, and on the date
+        when they have one. The oldest document of a match is the original.
+        Candidates are fetched with a single grouped query.
+
+        :return: dict mapping duplicate document id to its original
+        """
+        docs = self.filtered(lambda d: d.extracted_amount and d.extracted_vendor_norm)
+        if not docs:
+            return {}
+
+        groups = self._read_group(
+            [('extracted_vendor_norm', 'in', list(set(docs.mapped('extracted_vendor_norm')))),
+             ('extracted_amount', 'in', list(set(docs.mapped('extracted_amount'))))],
+            ['extracted_vendor_norm', 'extracted_amount', 'extracted_date:day'],
+            ['id:array_agg'],
+        )
+        by_date = {}
+        by_amount = {}
+        for vendor, amount, date, ids in groups:
+            by_date[vendor, amount, date] = ids
+            by_amount.setdefault((vendor, amount), []).extend(ids)
+
+        duplicates = {}
+        for doc in docs:
+            if doc.extracted_date:
+                ids = by_date.get((doc.extracted_vendor_norm, doc.extracted_amount, doc.extracted_date))
+            else:
+                ids = by_amount.get((doc.extracted_vendor_norm, doc.extracted_amount))
+            original_id = min(ids or [doc.id])
+            if original_id != doc.id:
+                duplicates.setdefault(original_id, []).append(doc.id)
+
+        result = {}
+        for original_id, doc_ids in duplicates.items():
+            original = self.browse(original_id)
+            self.browse(doc_ids).write({
+                'invoice_state': 'duplicate',
+                'duplicate_of_id': original.id,
+            })
+            result.update(dict.fromkeys(doc_ids, original))
+        return result
+
     def action_check_duplicate_invoice(self):
         """Check if this invoice document is a duplicate"""
         self.ensure_one()
         if not self.extracted_amount or not self.extracted_vendor:
             return
 
-        # Search for similar invoices
-        domain = [
-            ('id', '!=', self.id),
-            ('extracted_vendor', 'ilike', self.extracted_vendor),
-            ('extracted_amount', '=', self.extracted_amount),
-        ]
-        if self.extracted_date:
-            domain.append(('extracted_date', '=', self.extracted_date))
-
-        duplicates = self.search(domain, limit=1)
-        if duplicates:
-            self.write({
-                'invoice_state': 'duplicate',
-                'duplicate_of_id': duplicates[0].id,
-            })
+        original = self._batch_check_duplicates().get(self.id)
+        if original:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Duplicate Found'),
-                    'message': _('This document appears to be a duplicate of %s') % duplicates[0].name,
+                    'message': _('This document appears to be a duplicate of %s') % original.name,
                     'type': 'warning',
                 }
             }
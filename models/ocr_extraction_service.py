@@ -2,12 +2,198 @@
 
 import logging
 import base64
+import hashlib
 import io
-from odoo import models, fields, api, _
+import os
+import re
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import chain
+from psycopg2 import IntegrityError
+from psycopg2.extras import execute_values
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
 
+# Providers that accept a whole PDF in one request instead of page images.
+# AWS Textract only reads multi-page PDFs asynchronously from S3.
+PDF_NATIVE_PROVIDERS = ('azure', 'google')
+
+# Google Vision's synchronous file annotation handles at most 5 pages per call
+GOOGLE_PDF_PAGES_PER_REQUEST = 5
+
+PAGE_SEPARATOR = '\n\n--- Page Break ---\n\n'
+
+# Longest image side handed to Tesseract; an A4 page at 300 DPI is 3508 px
+# and Tesseract's runtime grows faster than the pixel count
+OCR_MAX_IMAGE_SIDE = 2500
+
+# Default cap on concurrent Tesseract processes for one document
+DEFAULT_OCR_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# Pages are parallelized by the thread pool; each tesseract process would
+# otherwise also start one OpenMP thread per core. pytesseract passes no
+# environment of its own, so this is set once for the server process at
+# import; set OMP_THREAD_LIMIT in the service environment to override it.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# Language detection OCRs a copy of the first page downscaled to this size
+LANGUAGE_SAMPLE_SIDE = 1200
+
+# Service fields that change the extracted text; cache entries are keyed on them
+OCR_CACHE_SETTINGS = ('languages', 'auto_detect_language', 'psm_mode', 'dpi',
+                      'enhance_image', 'binarize_image')
+
+# Cached extractions older than this are dropped by the autovacuum
+OCR_CACHE_MAX_AGE_DAYS = 180
+
+LANGDETECT_TO_TESSERACT = {
+    'de': 'deu',
+    'en': 'eng',
+    'fr': 'fra',
+    'it': 'ita',
+    'es': 'spa',
+    'nl': 'nld',
+}
+
+# Used to tell German from English when langdetect is not installed
+STOPWORDS = {
+    'deu': {'der', 'die', 'das', 'und', 'ist', 'nicht', 'mit', 'von', 'den', 'dem',
+            'des', 'ein', 'eine', 'zu', 'im', 'auf', 'sie', 'wir', 'bitte'},
+    'eng': {'the', 'and', 'is', 'not', 'with', 'of', 'to', 'for', 'this', 'that',
+            'on', 'in', 'are', 'be', 'by', 'from', 'you', 'we', 'please'},
+}
+
+
+def _load_image(image):
+    """Return a PIL image for encoded bytes or an already decoded image"""
+    from PIL import Image
+    return Image.open(io.BytesIO(image)) if isinstance(image, bytes) else image
+
+
+def _identify_language(text):
+    """Return the Tesseract code of the language of text, or None if unsure"""
+    try:
+        from langdetect import detect_langs
+        from langdetect.lang_detect_exception import LangDetectException
+    except ImportError:
+        words = re.findall(r'\w+', text.lower())
+        counts = sorted(
+            ((sum(word in stopwords for word in words), code) for code, stopwords in STOPWORDS.items()),
+            reverse=True,
+        )
+        (best, code), (runner_up, _code) = counts[0], counts[1]
+        return code if best >= 5 and best >= 3 * runner_up else None
+
+    try:
+        guess = detect_langs(text)[0]
+    except LangDetectException:
+        return None
+    return LANGDETECT_TO_TESSERACT.get(guess.lang) if guess.prob >= 0.9 else None
+
+
+def _detect_language(image, lang):
+    """Narrow a multi-language Tesseract setting to the language of a page
+
+    Returns lang unchanged when it names a single language, when the page
+    is not larger than the sample (detection would cost as much as the
+    OCR it is meant to speed up) or when the detected language is not one
+    of the configured ones.
+    """
+    candidates = lang.split('+')
+    if len(candidates) < 2:
+        return lang
+
+    from PIL import Image
+    import pytesseract
+
+    sample = _load_image(image)
+    if max(sample.size) <= LANGUAGE_SAMPLE_SIDE:
+        return lang
+    sample = sample.copy()
+    sample.thumbnail((LANGUAGE_SAMPLE_SIDE, LANGUAGE_SAMPLE_SIDE), Image.LANCZOS)
+    detected = _identify_language(pytesseract.image_to_string(sample, lang=lang))
+    return detected if detected in candidates else lang
+
+
+def _otsu_threshold(histogram):
+    """Return the grey level that best separates a 256-bin histogram"""
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    sum_bg = weight_bg = 0
+    best_variance, threshold = 0, 127
+    for level, count in enumerate(histogram):
+        weight_bg += count
+        if not weight_bg:
+            continue
+        weight_fg = total - weight_bg
+        if not weight_fg:
+            break
+        sum_bg += level * count
+        mean_delta = sum_bg / weight_bg - (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * mean_delta ** 2
+        if variance > best_variance:
+            best_variance, threshold = variance, level
+    return threshold
+
+
+def _enhance_image(img, binarize=False):
+    """Apply image enhancements for better OCR"""
+    try:
+        from PIL import ImageEnhance, ImageFilter
+    except ImportError:
+        return img
+
+    # Convert to grayscale if not already
+    if img.mode != 'L':
+        img = img.convert('L')
+
+    # Increase contrast
+    enhancer = ImageEnhance.Contrast(img)
+    img = enhancer.enhance(1.5)
+
+    # Sharpen
+    img = img.filter(ImageFilter.SHARPEN)
+
+    # Otsu binarization
+    if binarize:
+        threshold = _otsu_threshold(img.histogram())
+        img = img.point([255 if level > threshold else 0 for level in range(256)], '1')
+
+    return img
+
+
+def _tesseract_ocr(image, lang, enhance, binarize=False, psm='6'):
+    """OCR one image (encoded bytes or a PIL image) with Tesseract
+
+    Pure function of its arguments so it can run in worker threads:
+    Tesseract releases the GIL while recognizing, and no ORM state is
+    touched outside the main thread.
+    """
+    from PIL import Image
+    import pytesseract
+
+    # Load image
+    img = _load_image(image)
+
+    # Downscale oversized scans
+    if max(img.size) > OCR_MAX_IMAGE_SIDE:
+        img.thumbnail((OCR_MAX_IMAGE_SIDE, OCR_MAX_IMAGE_SIDE), Image.LANCZOS)
+
+    # Image enhancement
+    if enhance:
+        img = _enhance_image(img, binarize=binarize)
+
+    # Perform OCR
+    return pytesseract.image_to_string(
+        img,
+        lang=lang,
+        config=f'--psm {psm} --oem 1'  # --oem 1: LSTM engine only
+    )
+
 
 class OCRExtractionService(models.Model):
     """OCR Extraction Service for Document Text Recognition"""
@@ -35,9 +221,25 @@ class OCRExtractionService(models.Model):
         help='Languages for OCR (e.g., deu+eng for German and English)',
     )
 
+    psm_mode = fields.Selection([
+        ('1', 'Automatic with Orientation Detection'),
+        ('3', 'Fully Automatic'),
+        ('4', 'Single Column'),
+        ('6', 'Single Text Block'),
+    ], string='Page Segmentation', default='6',
+       help='Tesseract page segmentation mode. Orientation detection costs time on every page; '
+            'only use it for rotated or mixed scans.')
+
+    auto_detect_language = fields.Boolean(
+        string='Detect Language',
+        default=True,
+        help='OCR a downscaled sample of the first page, detect its language and run the '
+             'full OCR with that single language; all configured languages are used when unsure',
+    )
+
     dpi = fields.Integer(
         string='DPI for PDF Conversion',
-        default=300,
+        default=200,
         help='DPI resolution for converting PDFs to images',
     )
 
@@ -47,6 +249,18 @@ class OCRExtractionService(models.Model):
         help='Apply image enhancement before OCR',
     )
 
+    binarize_image = fields.Boolean(
+        string='Binarize Image',
+        default=True,
+        help='Convert enhanced images to black and white (Otsu threshold) before OCR',
+    )
+
+    ocr_max_workers = fields.Integer(
+        string='Parallel OCR Pages',
+        default=lambda self: DEFAULT_OCR_MAX_WORKERS,
+        help='Maximum number of PDF pages recognized at the same time by Tesseract',
+    )
+
     # Statistics
     documents_processed = fields.Integer(
         string='Documents Processed',
@@ -55,6 +269,35 @@ class OCRExtractionService(models.Model):
 
     last_run = fields.Datetime(string='Last Run', readonly=True)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        services = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return services
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Drop the cached active service and SDK clients built from old settings
+        if vals.keys() & {'active', 'provider', 'api_key', 'api_endpoint'}:
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    def _get_active_service(self):
+        """Return the active OCR service, or an empty recordset"""
+        return self.browse(self._get_active_ocr_service_id())
+
+    @api.model
+    @tools.ormcache()
+    def _get_active_ocr_service_id(self):
+        """Id of the first active OCR service, cached until services change"""
+        return self.sudo().search([('active', '=', True)], limit=1).id
+
     def extract_text(self, document):
         """Extract text from document attachment"""
         self.ensure_one()
@@ -64,30 +307,34 @@ class OCRExtractionService(models.Model):
 
         attachment = document.attachment_ids[0]
 
+        cached = self._get_cached_text(attachment)
+        if cached:
+            return cached
+
         try:
             if attachment.mimetype == 'application/pdf':
-                # Convert PDF to images first
-                images = self._pdf_to_images(attachment.raw)
-                text_parts = []
-                for img_data in images:
-                    text = self._extract_text_from_image(img_data)
-                    if text:
-                        text_parts.append(text)
-                full_text = '\n\n--- Page Break ---\n\n'.join(text_parts)
+                if self.provider in PDF_NATIVE_PROVIDERS:
+                    page_texts = self._extract_pdf_native(attachment.raw)
+                else:
+                    # Convert PDF to images first
+                    page_count, images = self._pdf_to_images(attachment.raw)
+                    page_texts = self._ocr_pages(images, page_count=page_count)
+                full_text = PAGE_SEPARATOR.join(text for text in page_texts if text)
+                pages = len(page_texts)
             elif attachment.mimetype and attachment.mimetype.startswith('image/'):
                 full_text = self._extract_text_from_image(attachment.raw)
+                pages = 1
             else:
                 return {'error': f'Unsupported file type: {attachment.mimetype}'}
 
             # Update statistics
-            self.sudo().write({
-                'documents_processed': self.documents_processed + 1,
-                'last_run': fields.Datetime.now(),
-            })
+            self._update_statistics()
+
+            self._store_cached_text(attachment, full_text, pages)
 
             return {
                 'text': full_text,
-                'pages': len(images) if attachment.mimetype == 'application/pdf' else 1,
+                'pages': pages,
                 'provider': self.provider,
             }
 
@@ -95,35 +342,154 @@ class OCRExtractionService(models.Model):
             _logger.exception(f"OCR extraction error: {e}")
             return {'error': str(e)}
 
+    def _update_statistics(self):
+        """Record a processed document without a read-modify-write race"""
+        self.env.cr.execute(f"""
+            UPDATE {self._table}
+               SET documents_processed = COALESCE(documents_processed, 0) + 1,
+                   last_run = (now() at time zone 'UTC')
+             WHERE id = %s
+        """, (self.id,))
+        self.invalidate_recordset(['documents_processed', 'last_run'])
+
+    def _get_cached_text(self, attachment):
+        """Return a previous extraction of identical content, if any"""
+        self.ensure_one()
+        if not attachment.checksum:
+            return None
+        hit = self.env['dms.ocr.cache'].sudo().search([
+            ('checksum', '=', attachment.checksum),
+            ('provider', '=', self.provider),
+            ('settings_key', '=', self._get_cache_settings_key()),
+        ], limit=1)
+        if not hit:
+            return None
+        return {
+            'text': hit.text or '',
+            'pages': hit.pages,
+            'provider': self.provider,
+        }
+
+    def _get_cache_settings_key(self):
+        """Return a digest of the settings that affect the extracted text"""
+        self.ensure_one()
+        settings = repr([self[field] for field in OCR_CACHE_SETTINGS])
+        return hashlib.sha1(settings.encode()).hexdigest()
+
+    def _store_cached_text(self, attachment, text, pages):
+        """Remember the extracted text for identical content"""
+        self.ensure_one()
+        if not attachment.checksum:
+            return
+        try:
+            with self.env.cr.savepoint():
+                self.env['dms.ocr.cache'].sudo().create({
+                    'checksum': attachment.checksum,
+                    'provider': self.provider,
+                    'settings_key': self._get_cache_settings_key(),
+                    'text': text,
+                    'pages': pages,
+                })
+        except IntegrityError:
+            # Extracted concurrently by another worker, keep its entry
+            pass
+
     def _pdf_to_images(self, pdf_data):
-        """Convert PDF pages to images"""
-        images = []
+        """Return the page count of a PDF and an iterator over its page images
+
+        Pages are rendered one at a time as the iterator is consumed.
+        Tesseract gets the rendered PIL images as they are; the cloud
+        providers need encoded PNG bytes.
+        """
+        dpi = self.dpi
+        encode = self.provider != 'tesseract'
 
         try:
             # Try pdf2image (requires poppler)
-            from pdf2image import convert_from_bytes
-            pil_images = convert_from_bytes(pdf_data, dpi=self.dpi)
-            for pil_img in pil_images:
-                img_buffer = io.BytesIO()
-                pil_img.save(img_buffer, format='PNG')
-                images.append(img_buffer.getvalue())
+            from pdf2image import convert_from_path, pdfinfo_from_path
         except ImportError:
             _logger.warning("pdf2image not installed, trying PyMuPDF")
+        else:
+            # Write the PDF once; poppler renders each page from that file
+            pdf_file = tempfile.NamedTemporaryFile(suffix='.pdf')
             try:
-                # Fallback to PyMuPDF (fitz)
-                import fitz
-                doc = fitz.open(stream=pdf_data, filetype='pdf')
+                pdf_file.write(pdf_data)
+                pdf_file.flush()
+                page_count = pdfinfo_from_path(pdf_file.name)['Pages']
+            except Exception:
+                pdf_file.close()
+                raise
+
+            def render_pages():
+                with pdf_file:
+                    for page_number in range(1, page_count + 1):
+                        pil_img = convert_from_path(
+                            pdf_file.name, dpi=dpi, first_page=page_number, last_page=page_number
+                        )[0]
+                        if not encode:
+                            yield pil_img
+                            continue
+                        img_buffer = io.BytesIO()
+                        pil_img.save(img_buffer, format='PNG')
+                        yield img_buffer.getvalue()
+
+            return page_count, render_pages()
+
+        try:
+            # Fallback to PyMuPDF (fitz)
+            import fitz
+        except ImportError:
+            _logger.error("Neither pdf2image nor PyMuPDF installed")
+            raise UserError(_('PDF processing requires pdf2image or PyMuPDF. '
+                            'Please install: pip install pdf2image or pip install PyMuPDF'))
+
+        doc = fitz.open(stream=pdf_data, filetype='pdf')
+
+        def render_pages():
+            try:
+                mat = fitz.Matrix(dpi / 72, dpi / 72)
                 for page in doc:
-                    mat = fitz.Matrix(self.dpi / 72, self.dpi / 72)
-                    pix = page.get_pixmap(matrix=mat)
-                    images.append(pix.tobytes('png'))
+                    pix = page.get_pixmap(matrix=mat, alpha=False)
+                    if encode:
+                        yield pix.tobytes('png')
+                    else:
+                        from PIL import Image
+                        yield Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+            finally:
                 doc.close()
-            except ImportError:
-                _logger.error("Neither pdf2image nor PyMuPDF installed")
-                raise UserError(_('PDF processing requires pdf2image or PyMuPDF. '
-                                'Please install: pip install pdf2image or pip install PyMuPDF'))
 
-        return images
+        return doc.page_count, render_pages()
+
+    def _ocr_pages(self, images, page_count=None):
+        """OCR page images in order, consuming them lazily
+
+        Tesseract pages run in a thread pool of at most ``ocr_max_workers``
+        threads, fewer when ``page_count`` is smaller; the worker only
+        receives plain option values read here, in the request thread. At
+        most two pages per worker are rendered ahead, so memory stays
+        bounded for long scans.
+        """
+        if self.provider != 'tesseract':
+            return [self._extract_text_from_image(img_data) for img_data in images]
+
+        images = iter(images)
+        first_page = next(images, None)
+        if first_page is None:
+            return []
+
+        # Detection only pays off when later pages reuse its result
+        options = self._tesseract_options(sample=first_page if page_count != 1 else None)
+        workers = max(1, min(self.ocr_max_workers or DEFAULT_OCR_MAX_WORKERS,
+                             page_count or DEFAULT_OCR_MAX_WORKERS))
+        texts = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for img_data in chain([first_page], images):
+                pending.append(executor.submit(_tesseract_ocr, img_data, **options))
+                if len(pending) >= 2 * workers:
+                    texts.append(pending.popleft().result())
+            texts.extend(future.result() for future in pending)
+        return texts
 
     def _extract_text_from_image(self, image_data):
         """Extract text from image using configured provider"""
@@ -139,79 +505,94 @@ class OCRExtractionService(models.Model):
             return f'Provider {self.provider} not implemented'
 
     def _ocr_tesseract(self, image_data):
-        """OCR using local Tesseract"""
+        """OCR using local Tesseract
+
+        A single image is read with all configured languages at once, a
+        detection pass before it would only add a second OCR run.
+        """
+        return _tesseract_ocr(image_data, **self._tesseract_options())
+
+    def _tesseract_options(self, sample=None):
+        """Check the Tesseract bindings and return the OCR options
+
+        :param sample: page image used to detect the document language
+        """
         try:
-            from PIL import Image
-            import pytesseract
+            from PIL import Image  # noqa: F401
+            import pytesseract  # noqa: F401
         except ImportError:
             raise UserError(_('Tesseract OCR requires: pip install pytesseract pillow\n'
                             'Also install Tesseract: brew install tesseract tesseract-lang'))
 
-        # Load image
-        img = Image.open(io.BytesIO(image_data))
-
-        # Image enhancement
-        if self.enhance_image:
-            img = self._enhance_image_pil(img)
-
-        # Perform OCR
-        text = pytesseract.image_to_string(
-            img,
-            lang=self.languages or 'deu+eng',
-            config='--psm 1'  # Automatic page segmentation with OSD
-        )
-
-        return text
+        lang = self.languages or 'deu+eng'
+        if sample is not None and self.auto_detect_language:
+            lang = _detect_language(sample, lang)
 
-    def _enhance_image_pil(self, img):
-        """Apply image enhancements for better OCR"""
-        try:
-            from PIL import ImageEnhance, ImageFilter
-        except ImportError:
-            return img
+        return {
+            'lang': lang,
+            'enhance': self.enhance_image,
+            'binarize': self.binarize_image,
+            'psm': self.psm_mode or '6',
+        }
 
-        # Convert to grayscale if not already
-        if img.mode != 'L':
-            img = img.convert('L')
+    def _extract_pdf_native(self, pdf_data):
+        """OCR a whole PDF in provider requests, return the text per page"""
+        if self.provider == 'azure':
+            return self._azure_read(pdf_data)
+        elif self.provider == 'google':
+            return self._ocr_google_pdf(pdf_data)
+        raise UserError(_('Provider %s cannot read PDF files directly') % self.provider)
 
-        # Increase contrast
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.5)
+    @tools.ormcache('self.id', 'self.provider')
+    def _get_ocr_client(self):
+        """Return the provider SDK client, shared by all calls of this service"""
+        if self.provider == 'azure':
+            try:
+                from azure.ai.formrecognizer import DocumentAnalysisClient
+                from azure.core.credentials import AzureKeyCredential
+            except ImportError:
+                raise UserError(_('Azure OCR requires: pip install azure-ai-formrecognizer'))
 
-        # Sharpen
-        img = img.filter(ImageFilter.SHARPEN)
+            if not self.api_key or not self.api_endpoint:
+                raise UserError(_('Azure API key and endpoint are required'))
 
-        return img
+            return DocumentAnalysisClient(
+                endpoint=self.api_endpoint,
+                credential=AzureKeyCredential(self.api_key)
+            )
+        elif self.provider == 'google':
+            try:
+                from google.cloud import vision
+            except ImportError:
+                raise UserError(_('Google OCR requires: pip install google-cloud-vision'))
+            return vision.ImageAnnotatorClient()
+        elif self.provider == 'aws':
+            try:
+                import boto3
+            except ImportError:
+                raise UserError(_('AWS OCR requires: pip install boto3'))
+            return boto3.client('textract')
+        return None
 
     def _ocr_azure(self, image_data):
         """OCR using Azure Form Recognizer"""
-        try:
-            from azure.ai.formrecognizer import DocumentAnalysisClient
-            from azure.core.credentials import AzureKeyCredential
-        except ImportError:
-            raise UserError(_('Azure OCR requires: pip install azure-ai-formrecognizer'))
-
-        if not self.api_key or not self.api_endpoint:
-            raise UserError(_('Azure API key and endpoint are required'))
+        return '\n'.join(self._azure_read(image_data))
 
-        client = DocumentAnalysisClient(
-            endpoint=self.api_endpoint,
-            credential=AzureKeyCredential(self.api_key)
-        )
+    def _azure_read(self, data):
+        """Run Azure prebuilt-read on an image or PDF, return the text per page"""
+        client = self._get_ocr_client()
 
         poller = client.begin_analyze_document(
             'prebuilt-read',
-            image_data
+            data
         )
         result = poller.result()
 
         # Extract text from result
-        text_parts = []
-        for page in result.pages:
-            for line in page.lines:
-                text_parts.append(line.content)
-
-        return '\n'.join(text_parts)
+        return [
+            '\n'.join(line.content for line in page.lines)
+            for page in result.pages
+        ]
 
     def _ocr_google(self, image_data):
         """OCR using Google Cloud Vision"""
@@ -220,7 +601,7 @@ class OCRExtractionService(models.Model):
         except ImportError:
             raise UserError(_('Google OCR requires: pip install google-cloud-vision'))
 
-        client = vision.ImageAnnotatorClient()
+        client = self._get_ocr_client()
         image = vision.Image(content=image_data)
 
         response = client.document_text_detection(image=image)
@@ -230,14 +611,78 @@ class OCRExtractionService(models.Model):
 
         return response.full_text_annotation.text
 
-    def _ocr_aws(self, image_data):
-        """OCR using AWS Textract"""
+    def _ocr_google_pdf(self, pdf_data):
+        """OCR a PDF with Google Cloud Vision file annotation, 5 pages per call
+
+        Every call only uploads its own pages, split off locally with
+        PyMuPDF. Without PyMuPDF the whole file is sent with a page range.
+        """
         try:
-            import boto3
+            import fitz
         except ImportError:
-            raise UserError(_('AWS OCR requires: pip install boto3'))
+            _logger.warning("PyMuPDF not installed, uploading the whole PDF for every Google Vision call")
+        else:
+            page_texts = []
+            doc = fitz.open(stream=pdf_data, filetype='pdf')
+            try:
+                for start in range(0, doc.page_count, GOOGLE_PDF_PAGES_PER_REQUEST):
+                    part = fitz.open()
+                    try:
+                        part.insert_pdf(
+                            doc, from_page=start,
+                            to_page=min(start + GOOGLE_PDF_PAGES_PER_REQUEST, doc.page_count) - 1,
+                        )
+                        page_texts.extend(self._google_annotate_pdf(part.tobytes())[0])
+                    finally:
+                        part.close()
+            finally:
+                doc.close()
+            return page_texts
+
+        page_texts = []
+        first_page, total_pages = 1, GOOGLE_PDF_PAGES_PER_REQUEST
+        while first_page <= total_pages:
+            last_page = min(first_page + GOOGLE_PDF_PAGES_PER_REQUEST - 1, total_pages)
+            # Without explicit pages the API reads the first five
+            texts, total_pages = self._google_annotate_pdf(
+                pdf_data, pages=list(range(first_page, last_page + 1)) if first_page > 1 else [],
+            )
+            page_texts.extend(texts)
+            # The page count is only known after the first call
+            first_page = last_page + 1
+
+        return page_texts
+
+    def _google_annotate_pdf(self, pdf_data, pages=()):
+        """Run one Google Vision file annotation call
+
+        :param pages: page numbers to read, the first five when empty
+        :return: (text per page, total page count of the file)
+        """
+        try:
+            from google.cloud import vision
+        except ImportError:
+            raise UserError(_('Google OCR requires: pip install google-cloud-vision'))
 
-        client = boto3.client('textract')
+        request = vision.AnnotateFileRequest(
+            input_config=vision.InputConfig(content=pdf_data, mime_type='application/pdf'),
+            features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+            pages=list(pages),
+        )
+        response = self._get_ocr_client().batch_annotate_files(requests=[request]).responses[0]
+        if response.error.message:
+            raise UserError(f'Google Vision error: {response.error.message}')
+
+        page_texts = []
+        for page_response in response.responses:
+            if page_response.error.message:
+                raise UserError(f'Google Vision error: {page_response.error.message}')
+            page_texts.append(page_response.full_text_annotation.text)
+        return page_texts, response.total_pages
+
+    def _ocr_aws(self, image_data):
+        """OCR using AWS Textract"""
+        client = self._get_ocr_client()
 
         response = client.detect_document_text(
             Document={'Bytes': image_data}
@@ -251,6 +696,43 @@ class OCRExtractionService(models.Model):
         return '\n'.join(text_parts)
 
 
+class OCRCache(models.Model):
+    """Extracted text keyed on attachment content"""
+
+    _name = 'dms.ocr.cache'
+    _description = 'OCR Cache'
+    _order = 'create_date desc'
+
+    checksum = fields.Char(string='Content Checksum', required=True)
+    provider = fields.Char(string='OCR Provider', required=True)
+    settings_key = fields.Char(string='Settings Digest')
+    text = fields.Text(string='Text')
+    pages = fields.Integer(string='Pages')
+
+    def init(self):
+        tools.create_unique_index(
+            self.env.cr, 'dms_ocr_cache_checksum_provider_settings_uniq', self._table,
+            ['checksum', 'provider', 'settings_key'],
+        )
+
+    @api.autovacuum
+    def _gc_expired_entries(self):
+        """Drop outdated extractions
+
+        Removes entries older than OCR_CACHE_MAX_AGE_DAYS and entries whose
+        content no longer belongs to any attachment, e.g. after a retention
+        deletion.
+        """
+        self.env.cr.execute(f"""
+            DELETE FROM {self._table} AS cache
+             WHERE cache.create_date < %s
+                OR NOT EXISTS (
+                       SELECT 1 FROM ir_attachment
+                        WHERE ir_attachment.checksum = cache.checksum)
+        """, (fields.Datetime.now() - timedelta(days=OCR_CACHE_MAX_AGE_DAYS),))
+        self.invalidate_model()
+
+
 class DocumentsDocumentOCR(models.Model):
     """Extend documents.document with OCR capabilities"""
 
@@ -275,9 +757,7 @@ class DocumentsDocumentOCR(models.Model):
         """Extract text from document using OCR"""
         self.ensure_one()
 
-        service = self.env['dms.ocr.extraction.service'].search(
-            [('active', '=', True)], limit=1
-        )
+        service = self.env['dms.ocr.extraction.service']._get_active_service()
         if not service:
             raise UserError(_('No active OCR service configured. '
                             'Please configure one in Property DMS > Configuration.'))
@@ -306,31 +786,95 @@ class DocumentsDocumentOCR(models.Model):
             }
         }
 
+    def action_extract_ocr_batch(self):
+        """Extract text from all documents and store the results in one UPDATE"""
+        # The UPDATE bypasses the ORM, check write access before any OCR work
+        self.check_access('write')
+
+        service = self.env['dms.ocr.extraction.service']._get_active_service()
+        if not service:
+            raise UserError(_('No active OCR service configured. '
+                            'Please configure one in Property DMS > Configuration.'))
+
+        rows = []
+        for doc in self:
+            result = service.extract_text(doc)
+            if 'error' in result:
+                _logger.warning(f"OCR extraction failed for {doc.name}: {result['error']}")
+                continue
+            rows.append((doc.id, result.get('text', '')))
+
+        self._bulk_set_ocr_results(rows)
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('OCR Complete'),
+                'message': _('Text extracted from %(done)d of %(total)d document(s).') % {
+                    'done': len(rows),
+                    'total': len(self),
+                },
+                'type': 'success' if len(rows) == len(self) else 'warning',
+                'sticky': False,
+            }
+        }
+
+    def _bulk_set_ocr_results(self, rows):
+        """Store OCR text for many documents with a single UPDATE
+
+        Bypasses the per-record ORM write; only the written fields are
+        invalidated afterwards.
+
+        :param rows: list of (document_id, text)
+        """
+        if not rows:
+            return
+        self.flush_model(['ocr_text', 'ocr_processed', 'ocr_date'])
+        execute_values(self.env.cr._obj, f"""
+            UPDATE {self._table} AS doc
+               SET ocr_text = v.text,
+                   ocr_processed = true,
+                   ocr_date = (now() at time zone 'UTC'),
+                   write_date = (now() at time zone 'UTC'),
+                   write_uid = {self.env.uid:d}
+              FROM (VALUES %s) AS v(id, text)
+             WHERE doc.id = v.id
+        """, rows, template='(%s, %s::text)')
+        self.browse([doc_id for doc_id, _text in rows]).invalidate_recordset([
+            'ocr_text', 'ocr_processed', 'ocr_date', 'write_date', 'write_uid',
+        ])
+
     def action_ocr_and_classify(self):
         """Perform OCR extraction followed by AI classification"""
         self.ensure_one()
 
+        values = {}
+        text = None
+
         # First OCR
-        ocr_service = self.env['dms.ocr.extraction.service'].search(
-            [('active', '=', True)], limit=1
-        )
+        ocr_service = self.env['dms.ocr.extraction.service']._get_active_service()
         if ocr_service:
             ocr_result = ocr_service.extract_text(self)
             if 'text' in ocr_result:
-                self.write({
-                    'ocr_text': ocr_result['text'],
+                text = ocr_result['text']
+                values.update({
+                    'ocr_text': text,
                     'ocr_processed': True,
                     'ocr_date': fields.Datetime.now(),
                 })
 
-        # Then classify
+        # Then classify, with the text extracted above
         ai_service = self.env['dms.ai.classification.service'].search(
             [('active', '=', True)], limit=1
         )
         if ai_service:
-            result = ai_service.classify_document(self)
-            if 'error' not in result:
-                ai_service.apply_classification(self, result)
+            result = ai_service.classify_document(self, text=text)
+            values.update(ai_service._prepare_classification_values(result))
+
+        # Store OCR and classification results in one write
+        if values:
+            self.write(values)
 
         return {
             'type': 'ir.actions.client',